@@ -0,0 +1,52 @@
+"""Vectorized analytics over depth arrays (see OrderBook.depth_arrays)
+
+Prices/quantities are arrays of one side from best price: int64 ticks or float64. Results are float64 in units
+of input arrays (ticks stay ticks, divide by order_book.TICKS_PER_UNIT for decimal units).
+"""
+import numpy as np
+
+
+def cumulative_depth(quantities):
+    """Cumulative quantity from best level: [q0, q0 + q1, ...]"""
+    return np.cumsum(quantities)
+
+
+def cumulative_notional(prices, quantities):
+    """Cumulative price * quantity from best level (float64, int64 ticks product can overflow)"""
+    return np.cumsum(np.multiply(prices, quantities, dtype=np.float64))
+
+
+def vwap_to_fill(prices, quantities, sizes):
+    """Average price of filling sizes by walking levels from best price
+
+    :param sizes: size or array of sizes (> 0)
+    :return: VWAP (float or float64 array for array of sizes), nan where side has not enough quantity
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    depth = np.concatenate(([0.0], np.cumsum(quantities, dtype=np.float64)))
+    notional = np.concatenate(([0.0], cumulative_notional(prices, quantities)))
+    # prices[idx] is the level where fill of size stops
+    idx = np.searchsorted(depth, sizes, side="left") - 1
+    filled = idx < len(prices)
+    idx = np.minimum(idx, len(prices) - 1)
+    rest = sizes - depth[idx]
+    level_prices = np.asarray(prices, dtype=np.float64)[idx] if len(prices) else np.zeros_like(sizes)
+    vwap = np.where(filled, (notional[idx] + level_prices * rest) / sizes, np.nan)
+    return vwap if vwap.ndim else float(vwap)
+
+
+def imbalance(bid_quantities, ask_quantities, n=None):
+    """Order book imbalance of top n levels: (bids - asks) / (bids + asks) in [-1, 1], nan for empty book"""
+    bids = float(np.sum(bid_quantities[:n], dtype=np.float64))
+    asks = float(np.sum(ask_quantities[:n], dtype=np.float64))
+    if bids + asks == 0:
+        return float("nan")
+    return (bids - asks) / (bids + asks)
+
+
+def imbalance_by_depth(bid_quantities, ask_quantities):
+    """Imbalance of top k levels for every k = 1..min(count of bid levels, count of ask levels)"""
+    n = min(len(bid_quantities), len(ask_quantities))
+    bids = np.cumsum(bid_quantities[:n], dtype=np.float64)
+    asks = np.cumsum(ask_quantities[:n], dtype=np.float64)
+    return (bids - asks) / (bids + asks)
@@ -0,0 +1,72 @@
+"""Throughput benchmark for BookManager
+
+Orders of many trading pairs are added (2 of 3 are cancelled) through BookManager with different count of
+worker processes. Result for one process hosting all OrderBooks is printed as baseline.
+
+Note:
+    Scaling is limited by count of cpu and by pickling of commands in the parent process,
+    bigger --batch-size amortizes cost of messages
+
+Usage: python benchmarks/bench_book_manager.py [--ops 200000] [--pairs 200] [--workers 1 2 4] [--batch-size 5000]
+"""
+import argparse
+import os
+import sys
+import time
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from book_manager import BookManager  # noqa: E402
+from order_book import OrderBook, OrderType, TickOrder  # noqa: E402
+
+
+def build_orders(pairs, count):
+    rnd = Random(1)
+    return [TickOrder(rnd.choice(pairs), rnd.randint(1, 1000) * 10 ** 6, rnd.randint(1, 10 ** 8),
+                      rnd.choice([OrderType.ASK, OrderType.BID]), "owner")
+            for _ in range(count)]
+
+
+def run_single(pairs, orders):
+    order_books = {pair: OrderBook(pair, use_ticks=True) for pair in pairs}
+    start = time.perf_counter()
+    for i, order in enumerate(orders):
+        order_book = order_books[order.trading_pair]
+        order_book.add_order(order)
+        if i % 3:
+            order_book.remove_order(order.id)
+    return time.perf_counter() - start
+
+
+def run_manager(pairs, orders, workers, batch_size):
+    with BookManager(pairs, workers=workers, batch_size=batch_size, use_ticks=True) as manager:
+        start = time.perf_counter()
+        for i, order in enumerate(orders):
+            manager.submit_order(order)
+            if i % 3:
+                manager.submit_remove(order.trading_pair, order.id)
+        manager.flush()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200_000, help="count of added orders per run")
+    parser.add_argument("--pairs", type=int, default=200, help="count of trading pairs")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    pairs = [f"PAIR{idx}_USD" for idx in range(args.pairs)]
+    orders = build_orders(pairs, args.ops)
+    total_ops = args.ops * 5 // 3  # adds + cancels
+    print(f"cpu count: {os.cpu_count()}")
+    print(f"{'workers':>7} {'ops/s':>12}")
+    print(f"{'single':>7} {total_ops / run_single(pairs, orders):>12.0f}")
+    for workers in args.workers:
+        print(f"{workers:>7} {total_ops / run_manager(pairs, orders, workers, args.batch_size):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Multi-threaded stress benchmark for ConcurrentOrderBook
+
+Every writer thread adds orders and cancels 2 of 3 of them (asks and bids threads alternate), one reader thread
+polls market_data. Reports total writer throughput and reader throughput by count of threads for
+ConcurrentOrderBook and for OrderBook serialized by one outer lock (best of --repeat runs).
+
+Note:
+    With CPython GIL threads don't execute python code in parallel, so this benchmark shows lock overhead and
+    contention, real scaling needs free-threaded interpreter or processes (see BookManager).
+    ConcurrentOrderBook writers are slower than one outer lock (side locks, owner index and feed locks on every
+    change), readers of market_data don't wait for writers, so they get much more reads (and CPU) instead
+
+Usage: python benchmarks/bench_concurrency.py [--ops 20000] [--threads 1 2 4 8] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent_order_book import ConcurrentOrderBook  # noqa: E402
+from order_book import OrderBook, OrderType, TickOrder  # noqa: E402
+
+TRADING_PAIR = "BTC_USD"
+
+
+class LockedOrderBook:
+    """OrderBook serialized by one outer lock (how it has to be shared without ConcurrentOrderBook)"""
+
+    def __init__(self):
+        self._order_book = OrderBook(TRADING_PAIR, use_ticks=True)
+        self._lock = threading.Lock()
+
+    def add_order(self, order):
+        with self._lock:
+            return self._order_book.add_order(order)
+
+    def remove_order(self, order_id):
+        with self._lock:
+            return self._order_book.remove_order(order_id)
+
+    @property
+    def market_data(self):
+        with self._lock:
+            return self._order_book.market_data
+
+
+def build_orders(idx, count):
+    rnd = Random(idx)
+    type_ = OrderType.ASK if idx % 2 else OrderType.BID
+    return [TickOrder(TRADING_PAIR, rnd.randint(1, 1000) * 10 ** 6, rnd.randint(1, 10 ** 8), type_, str(idx))
+            for _ in range(count)]
+
+
+def run(order_book, threads_count, ops):
+    orders_by_thread = [build_orders(idx, ops // threads_count) for idx in range(threads_count)]
+    done = threading.Event()
+
+    def writer(orders):
+        for i, order in enumerate(orders):
+            order_book.add_order(order)
+            if i % 3:
+                order_book.remove_order(order.id)
+
+    reads = 0
+
+    def reader():
+        nonlocal reads
+        while not done.is_set():
+            order_book.market_data
+            reads += 1
+
+    reader_thread = threading.Thread(target=reader)
+    writers = [threading.Thread(target=writer, args=(orders,)) for orders in orders_by_thread]
+    reader_thread.start()
+    start = time.perf_counter()
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    reader_thread.join()
+    total_ops = sum(len(orders) * 5 // 3 for orders in orders_by_thread)  # adds + cancels
+    return total_ops / elapsed, reads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20_000, help="count of added orders per run")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3, help="count of runs, best run is reported")
+    args = parser.parse_args()
+
+    print(f"{'threads':>7} {'concurrent ops/s':>17} {'reads/s':>9} {'outer lock ops/s':>17} {'reads/s':>9}")
+    for threads_count in args.threads:
+        concurrent = max(run(ConcurrentOrderBook(TRADING_PAIR, use_ticks=True), threads_count, args.ops)
+                         for _ in range(args.repeat))
+        locked = max(run(LockedOrderBook(), threads_count, args.ops) for _ in range(args.repeat))
+        print(f"{threads_count:>7} {concurrent[0]:>17.0f} {concurrent[1]:>9.0f} {locked[0]:>17.0f} {locked[1]:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Load generator for OrderGateway
+
+Every connection sends requests with Poisson arrivals (open loop, --rate requests/s per connection):
+adds of random orders, cancels of own resting orders and snapshots. Latency is measured from planned send time
+to response, so queueing in client and server is included. Gateway is started in separate process
+unless --port/--unix of running gateway is set.
+
+Usage: python benchmarks/bench_gateway.py [--connections 4] [--rate 5000] [--duration 5] [--port PORT]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway import GatewayClient  # noqa: E402
+from order_book import OrderType  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def run_connection(idx, args, latencies, errors):
+    client = await GatewayClient.connect(args.host, args.port, args.unix)
+    rnd = Random(idx)
+    resting = []
+    pending = set()
+
+    async def send(planned, coro):
+        try:
+            result = await coro
+        except Exception:
+            errors.append(1)
+            return None
+        latencies.append(time.perf_counter() - planned)
+        return result
+
+    async def add(planned):
+        result = await send(planned, client.add_order(
+            rnd.randint(9_900, 10_100) * 10 ** 6, rnd.randint(1, 10 ** 8),
+            rnd.choice([OrderType.ASK, OrderType.BID]), f"owner-{idx}",
+        ))
+        if result is not None:
+            resting.append(result[0])
+
+    start = planned = time.perf_counter()
+    while planned - start < args.duration:
+        planned += rnd.expovariate(args.rate)
+        delay = planned - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rnd.random()
+        if kind < 0.1:
+            task = asyncio.create_task(send(planned, client.market_data()))
+        elif kind < 0.5 and resting:
+            task = asyncio.create_task(send(planned, client.cancel_order(resting.pop(rnd.randrange(len(resting))))))
+        else:
+            task = asyncio.create_task(add(planned))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    await asyncio.gather(*pending)
+    await client.close()
+
+
+async def run(args):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_connection(idx, args, latencies, errors) for idx in range(args.connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"requests: {len(latencies)}, errors: {len(errors)}, throughput: {len(latencies) / elapsed:.0f} req/s")
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999)):
+        print(f"{name:>6}: {percentile(latencies, q) * 1e6:10.0f} us")
+    print(f"{'max':>6}: {latencies[-1] * 1e6:10.0f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=5000, help="mean requests per second per connection")
+    parser.add_argument("--duration", type=float, default=5, help="seconds")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="port of running gateway")
+    parser.add_argument("--unix", default=None, help="Unix socket of running gateway")
+    args = parser.parse_args()
+
+    server = None
+    if args.port is None and args.unix is None:
+        args.port = 5599
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "gateway.py"), "--port", str(args.port), "--ticks"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        server.stdout.readline()  # wait "Listening on ..."
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Memory usage of resting orders
+
+Build OrderBook with N resting orders and report bytes per order (orders + containers + indexes),
+measured with tracemalloc.
+
+Usage: python benchmarks/bench_memory.py [--orders 100000] [--ticks]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from decimal import Decimal
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_book import Order, OrderBook, OrderType, TickOrder  # noqa: E402
+
+TRADING_PAIR = "BTC_USD"
+
+
+def build_orders(count, ticks=False, seed=0):
+    rnd = Random(seed)
+    owners = [f"owner-{i}" for i in range(1000)]
+    orders = []
+    for _ in range(count):
+        price = round(rnd.gauss(10_000_00, 5_00)) * 10 ** 6  # prices clustered near mid with 0.01 step
+        volume = rnd.randint(1, 10 ** 8)
+        type_ = rnd.choice([OrderType.ASK, OrderType.BID])
+        if ticks:
+            orders.append(TickOrder(TRADING_PAIR, price, volume, type_, rnd.choice(owners)))
+        else:
+            orders.append(Order(
+                TRADING_PAIR, Decimal(price).scaleb(-8), Decimal(volume).scaleb(-8), type_, rnd.choice(owners)
+            ))
+    return orders
+
+
+def bytes_per_order(count, ticks=False):
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    order_book = OrderBook(TRADING_PAIR, use_ticks=True) if ticks else OrderBook(TRADING_PAIR)
+    for order in build_orders(count, ticks):
+        order_book.add_order(order)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (current - start) / count, order_book
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--ticks", action="store_true", help="use TickOrder and OrderBook(use_ticks=True)")
+    args = parser.parse_args()
+
+    per_order, order_book = bytes_per_order(args.orders, args.ticks)
+    print(f"orders={args.orders} levels={len(order_book.asks) + len(order_book.bids)} "
+          f"bytes_per_order={per_order:.1f}")
+
+
+if __name__ == "__main__":
+    main()
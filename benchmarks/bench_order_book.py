@@ -0,0 +1,245 @@
+"""Reproducible benchmark suite for OrderBook hot paths
+
+Workloads (all seeded):
+    poisson       add/cancel/get_order_by/market_data as independent Poisson processes, prices clustered near mid
+    cancel_heavy  same flow where ~90% of added orders are cancelled (market making like flow)
+    deep_book     book prefilled with --deep-orders resting orders (10^6 by default), then poisson flow on top
+
+For every workload and operation reports ops/sec, latency percentiles and peak memory allocated by one call
+(separate tracemalloc pass over first --memory-ops events, tracing slows operations down).
+Results can be saved to JSON (--output) and compared with stored baseline (--compare), exit code is 1 if
+any operation became slower than --threshold.
+
+Usage: python benchmarks/bench_order_book.py [--ops 200000] [--deep-orders 1000000] [--ticks] [--seed 0]
+    [--workloads poisson cancel_heavy deep_book] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from random import Random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_book import Order, OrderBook, OrderType, TickOrder  # noqa: E402
+
+TRADING_PAIR = "BTC_USD"
+MID = 10_000_00  # in 0.01 steps
+PRICE_SIGMA = 5_00
+OPERATIONS = ("add_order", "remove_order", "get_order_by", "market_data")
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999))
+
+
+class OrderFactory:
+    """Seeded orders with prices clustered near mid (asks above, bids below), ids and ts are seeded too"""
+
+    def __init__(self, rnd: Random, ticks=False):
+        self.rnd = rnd
+        self.ticks = ticks
+        self.owners = [f"owner-{i}" for i in range(1000)]
+
+    def __call__(self, ts):
+        rnd = self.rnd
+        type_ = OrderType.ASK if rnd.random() < 0.5 else OrderType.BID
+        offset = abs(round(rnd.gauss(0, PRICE_SIGMA))) + 1
+        price = (MID + offset if type_ == OrderType.ASK else MID - offset) * 10 ** 6
+        volume = rnd.randint(1, 10 ** 8)
+        order_id = rnd.getrandbits(128).to_bytes(16, "little")
+        owner_id = self.owners[rnd.randrange(len(self.owners))]
+        if self.ticks:
+            return TickOrder(TRADING_PAIR, price, volume, type_, owner_id, order_id, ts)
+        return Order(TRADING_PAIR, Decimal(price).scaleb(-8), Decimal(volume).scaleb(-8), type_, owner_id,
+                     order_id, ts)
+
+
+def poisson_events(rnd: Random, count, rates):
+    """Merge independent Poisson processes with rates {operation: events per second}
+
+    :return: list of (ts in ns, operation) sorted by ts
+    """
+    total_rate = sum(rates.values())
+    operations = list(rates)
+    weights = [rates[operation] for operation in operations]
+    ts = 0.0
+    events = []
+    for operation in rnd.choices(operations, weights, k=count):
+        # superposition of Poisson processes is Poisson process with total rate, types are independent
+        ts += rnd.expovariate(total_rate)
+        events.append((int(ts * 1e9), operation))
+    return events
+
+
+# args which change workload, results are comparable only when they are equal
+WORKLOAD_ARGS = ("ops", "deep_orders", "ticks", "seed")
+
+WORKLOADS = {
+    "poisson": {"add_order": 1000, "remove_order": 600, "get_order_by": 200, "market_data": 200},
+    "cancel_heavy": {"add_order": 1000, "remove_order": 900, "get_order_by": 50, "market_data": 50},
+    "deep_book": {"add_order": 1000, "remove_order": 1000, "get_order_by": 200, "market_data": 200},
+}
+
+
+def build_workload(name, args):
+    """Return (prefill orders, [(operation, arg), ...]) for workload, same seed -> same workload"""
+    rnd = Random(f"{args.seed}-{name}")
+    make_order = OrderFactory(rnd, args.ticks)
+    prefill = [make_order(0) for _ in range(args.deep_orders)] if name == "deep_book" else []
+    resting = [order.id for order in prefill]
+    ops = []
+    for ts, operation in poisson_events(rnd, args.ops, WORKLOADS[name]):
+        if operation == "add_order" or (operation != "market_data" and not resting):
+            order = make_order(ts)
+            resting.append(order.id)
+            ops.append(("add_order", order))
+        elif operation == "remove_order":
+            # swap remove of random resting order
+            idx = rnd.randrange(len(resting))
+            resting[idx], resting[-1] = resting[-1], resting[idx]
+            ops.append(("remove_order", resting.pop()))
+        elif operation == "get_order_by":
+            ops.append(("get_order_by", resting[rnd.randrange(len(resting))]))
+        else:
+            ops.append(("market_data", None))
+    return prefill, ops
+
+
+def new_order_book(prefill, ticks):
+    order_book = OrderBook(TRADING_PAIR, use_ticks=ticks)
+    for idx in range(0, len(prefill), 10_000):
+        order_book.add_orders(prefill[idx:idx + 10_000])
+    return order_book
+
+
+def _call(order_book, operation, arg):
+    if operation == "market_data":
+        return order_book.market_data
+    return getattr(order_book, operation)(arg)
+
+
+def measure_latency(order_book, ops):
+    """:return: ({operation: [latency ns, ...]}, wall time in seconds)"""
+    latencies = {operation: [] for operation in OPERATIONS}
+    perf_counter_ns = time.perf_counter_ns
+    gc.collect()
+    start = time.perf_counter()
+    for operation, arg in ops:
+        t0 = perf_counter_ns()
+        _call(order_book, operation, arg)
+        latencies[operation].append(perf_counter_ns() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def measure_memory(order_book, ops):
+    """:return: {operation: max bytes allocated at peak of one call}"""
+    peaks = {operation: 0 for operation in OPERATIONS}
+    for operation, arg in ops:
+        # tracing is restarted per call, so peak is counted from zero (tracemalloc.reset_peak needs Python 3.9)
+        tracemalloc.start()
+        try:
+            _call(order_book, operation, arg)
+            peaks[operation] = max(peaks[operation], tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return peaks
+
+
+def summarize(latencies, peaks):
+    result = {}
+    for operation, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        stats = {"count": len(values), "ops_per_sec": round(len(values) / (sum(values) / 1e9), 1)}
+        for name, q in PERCENTILES:
+            stats[f"{name}_ns"] = values[min(len(values) - 1, int(len(values) * q))]
+        stats["max_ns"] = values[-1]
+        stats["peak_bytes"] = peaks[operation]
+        result[operation] = stats
+    return result
+
+
+def run_workload(name, args):
+    prefill, ops = build_workload(name, args)
+    order_book = new_order_book(prefill, args.ticks)
+    latencies, elapsed = measure_latency(order_book, ops)
+    del order_book  # deep books are big, don't keep two of them
+    memory_ops = ops[:args.memory_ops]
+    peaks = measure_memory(new_order_book(prefill, args.ticks), memory_ops)
+    result = summarize(latencies, peaks)
+    result["total"] = {"count": len(ops), "ops_per_sec": round(len(ops) / elapsed, 1)}
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Print changes against baseline
+
+    :return: list of regression descriptions (ops/sec dropped or p99 grown more than threshold)
+    """
+    regressions = []
+    for workload, operations in results.items():
+        for operation, stats in operations.items():
+            base = baseline.get(workload, {}).get(operation)
+            if base is None:
+                continue
+            speed = stats["ops_per_sec"] / base["ops_per_sec"]
+            line = f"{workload:>13} {operation:>13} ops/sec x{speed:.2f}"
+            if speed < 1 - threshold:
+                regressions.append(f"{workload}.{operation} ops/sec x{speed:.2f}")
+            if "p99_ns" in stats and base.get("p99_ns"):
+                p99 = stats["p99_ns"] / base["p99_ns"]
+                line += f"  p99 x{p99:.2f}"
+                if p99 > 1 + threshold:
+                    regressions.append(f"{workload}.{operation} p99 x{p99:.2f}")
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200_000, help="count of operations per workload")
+    parser.add_argument("--deep-orders", type=int, default=1_000_000, help="resting orders of deep_book")
+    parser.add_argument("--memory-ops", type=int, default=20_000, help="count of operations of memory pass")
+    parser.add_argument("--ticks", action="store_true", help="use TickOrder and OrderBook(use_ticks=True)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--output", help="save results to JSON file")
+    parser.add_argument("--compare", help="JSON file with baseline results")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.workloads:
+        results[name] = run_workload(name, args)
+        print(f"{name}: {results[name]['total']['ops_per_sec']:.0f} ops/sec")
+        print(f"{'operation':>13} {'count':>8} {'ops/sec':>10} {'p50 ns':>8} {'p99 ns':>8} {'p99.9 ns':>9} "
+              f"{'peak B':>7}")
+        for operation in OPERATIONS:
+            stats = results[name].get(operation)
+            if stats:
+                print(f"{operation:>13} {stats['count']:>8} {stats['ops_per_sec']:>10.0f} {stats['p50_ns']:>8} "
+                      f"{stats['p99_ns']:>8} {stats['p999_ns']:>9} {stats['peak_bytes']:>7}")
+
+    if args.output:
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                **{key: value for key, value in vars(args).items() if key not in ("output", "compare")}}
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in WORKLOAD_ARGS:
+            if baseline["meta"].get(key) != getattr(args, key):
+                print(f"Warning: baseline has other {key}={baseline['meta'].get(key)!r}, results are not comparable")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import multiprocessing
+import zlib
+
+from order_book import OrderBook
+
+
+class Command:
+    ADD = "add"
+    REMOVE = "remove"
+    GET = "get"
+    MARKET_DATA = "market_data"
+
+
+def _apply_command(order_books, command):
+    name, trading_pair, arg = command
+    order_book = order_books.get(trading_pair)
+    if order_book is None:
+        raise Exception(f"Not supported {trading_pair=}")
+    if name == Command.ADD:
+        return order_book.add_order(arg)
+    if name == Command.REMOVE:
+        return order_book.remove_order(arg)
+    if name == Command.GET:
+        return order_book.get_order_by(arg)
+    if name == Command.MARKET_DATA:
+        return order_book.market_data
+    raise Exception(f"Not supported command {name=}")
+
+
+def _worker_main(conn, trading_pairs, book_kwargs):
+    """Shard process: owns OrderBooks of its trading pairs and applies batches of commands in order"""
+    order_books = {trading_pair: OrderBook(trading_pair, **book_kwargs) for trading_pair in trading_pairs}
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        results = []
+        for command in batch:
+            try:
+                results.append((True, _apply_command(order_books, command)))
+            except Exception as e:
+                results.append((False, str(e)))
+        conn.send(results)
+    conn.close()
+
+
+class BookManager:
+    """Front end for OrderBooks of many trading pairs sharded across processes
+
+    Note:
+        Every trading pair is owned by one worker process (shared-nothing), commands for one pair are applied
+        in submit order. Commands are buffered per worker and sent as one message per worker on flush,
+        all workers process their batches in parallel.
+
+    Args:
+        trading_pairs (list[str]): supported trading pairs
+        workers (int, optional): count of worker processes, by default count of cpu
+        batch_size (int, optional): flush automatically when count of buffered commands reaches batch_size
+        mp_context (optional): multiprocessing context, default context by default
+        **book_kwargs: args for every OrderBook (asks_count, use_ticks, matching, ...)
+    """
+
+    def __init__(self, trading_pairs, workers=None, batch_size=1000, mp_context=None, **book_kwargs):
+        workers = min(workers or multiprocessing.cpu_count(), len(trading_pairs))
+        if workers <= 0:
+            raise Exception("BookManager requires at least one trading pair")
+        self.batch_size = batch_size
+        self._shard_by_pair = {pair: zlib.crc32(pair.encode()) % workers for pair in trading_pairs}
+        mp_context = mp_context or multiprocessing.get_context()
+        self._connections = []
+        self._processes = []
+        for shard in range(workers):
+            parent_conn, child_conn = mp_context.Pipe()
+            pairs = [pair for pair, pair_shard in self._shard_by_pair.items() if pair_shard == shard]
+            process = mp_context.Process(target=_worker_main, args=(child_conn, pairs, book_kwargs), daemon=True)
+            process.start()
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+        self._pending = [[] for _ in range(workers)]  # shard -> [command, ...]
+        self._pending_positions = [[] for _ in range(workers)]  # shard -> [index in results, ...]
+        self._pending_count = 0
+        self._results = []
+
+    @property
+    def trading_pairs(self):
+        return list(self._shard_by_pair)
+
+    def _submit(self, command):
+        shard = self._shard_by_pair.get(command[1])
+        if shard is None:
+            raise Exception(f"Not supported trading_pair={command[1]!r}")
+        self._pending[shard].append(command)
+        self._pending_positions[shard].append(len(self._results) + self._pending_count)
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size:
+            self._send_and_receive()
+
+    def _send_and_receive(self):
+        shards = [shard for shard, batch in enumerate(self._pending) if batch]
+        for shard in shards:
+            self._connections[shard].send(self._pending[shard])
+        results = [None] * self._pending_count
+        for shard in shards:
+            for position, result in zip(self._pending_positions[shard], self._connections[shard].recv()):
+                results[position - len(self._results)] = result
+            self._pending[shard] = []
+            self._pending_positions[shard] = []
+        self._results.extend(results)
+        self._pending_count = 0
+
+    def submit_order(self, order):
+        self._submit((Command.ADD, order.trading_pair, order))
+
+    def submit_remove(self, trading_pair, order_id):
+        self._submit((Command.REMOVE, trading_pair, order_id))
+
+    def flush(self):
+        """Send buffered commands and return results of all commands submitted since previous flush
+
+        :return: list of (is_ok, result or error message) in submit order
+        """
+        if self._pending_count:
+            self._send_and_receive()
+        results, self._results = self._results, []
+        return results
+
+    def _execute(self, commands):
+        """Submit commands and send all buffered commands, results of previously submitted commands are kept
+        for next flush
+
+        :return: list of (is_ok, result or error message) of commands only
+        """
+        start = len(self._results) + self._pending_count
+        for command in commands:
+            self._submit(command)
+        if self._pending_count:
+            self._send_and_receive()
+        results = self._results[start:]
+        del self._results[start:]
+        return results
+
+    def _call(self, command):
+        is_ok, result = self._execute((command,))[0]
+        if not is_ok:
+            raise Exception(result)
+        return result
+
+    def add_order(self, order):
+        """Add order to OrderBook of its trading pair (previously submitted commands are sent too, their results
+        are returned by next flush)
+        """
+        return self._call((Command.ADD, order.trading_pair, order))
+
+    def add_orders(self, orders):
+        """Add many orders with one message per worker
+
+        :return: list of (is_ok, trades or error message) in orders order
+        """
+        return self._execute([(Command.ADD, order.trading_pair, order) for order in orders])
+
+    def remove_order(self, trading_pair, order_id):
+        return self._call((Command.REMOVE, trading_pair, order_id))
+
+    def get_order_by(self, trading_pair, order_id):
+        return self._call((Command.GET, trading_pair, order_id))
+
+    def market_data(self, trading_pair=None):
+        """Market data of one trading pair or dict trading_pair -> market data for all pairs"""
+        if trading_pair is not None:
+            return self._call((Command.MARKET_DATA, trading_pair, None))
+        results = self._execute([(Command.MARKET_DATA, pair, None) for pair in self._shard_by_pair])
+        return {pair: result for pair, (_, result) in zip(self._shard_by_pair, results)}
+
+    def close(self):
+        self.flush()
+        for conn in self._connections:
+            conn.send(None)
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
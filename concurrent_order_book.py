@@ -0,0 +1,222 @@
+import threading
+from contextlib import contextmanager
+
+from order_book import LevelUpdate, OrderBook, OrderList, OrderType
+
+
+class ConcurrentOrderBook(OrderBook):
+    """Thread-safe OrderBook
+
+    Note:
+        Writers take lock of the side they change (asks or bids), so adding/removing of asks and bids don't wait
+        each other. Operations which can touch both sides (matching, batches) take both locks in fixed order.
+        Readers of market_data don't take locks while snapshot is valid (it is immutable and replaced by reference),
+        stale snapshot is rebuilt under both locks, so snapshot never shows half-applied update.
+        With CPython GIL writers don't run in parallel, and locks taken on every change (side, owner index, feed)
+        make writes slower than OrderBook behind one outer lock (see benchmarks/bench_concurrency.py).
+        Use this class when readers shouldn't wait for writers, BookManager for write throughput.
+        Same args as OrderBook
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._locks = {OrderType.ASK: threading.Lock(), OrderType.BID: threading.Lock()}
+        # seq and pending level updates are shared by both sides
+        self._feed_lock = threading.RLock()
+        # order sets of owner are shared by both sides
+        self._owners_lock = threading.Lock()
+        # expiry heap is shared by both sides
+        self._expiry_lock = threading.Lock()
+
+    @contextmanager
+    def _all_locks(self):
+        with self._locks[OrderType.ASK], self._locks[OrderType.BID]:
+            yield
+
+    def _locks_for_type(self, type_):
+        if self.matching or type_ not in self._locks:
+            return self._all_locks()
+        return self._locks[type_]
+
+    def _add_level_orders(self, type_, price, orders):
+        # order with same id (or client_id) can be added to other side concurrently,
+        # so ids are reserved atomically before adding
+        reserve_token = object()
+        orders_meta = self.orders_meta
+        for idx, order in enumerate(orders):
+            error = None
+            if orders_meta.setdefault(order.id, reserve_token) is not reserve_token:
+                error = "Order exist in this OrderBook"
+            elif order.client_id is not None and \
+                    self.client_ids.setdefault(order.client_id, reserve_token) is not reserve_token:
+                error = "Order with same client_id exist in this OrderBook"
+                del orders_meta[order.id]
+            if error is not None:
+                for reserved in orders[:idx]:
+                    del orders_meta[reserved.id]
+                    if reserved.client_id is not None:
+                        del self.client_ids[reserved.client_id]
+                raise Exception(error)
+        super()._add_level_orders(type_, price, orders)
+
+    def _schedule_expiry(self, order):
+        with self._expiry_lock:
+            super()._schedule_expiry(order)
+
+    def _owner_orders_added(self, orders):
+        owner_orders = self.owner_orders
+        with self._owners_lock:
+            for order in orders:
+                order_ids = owner_orders.get(order.owner_id)
+                if order_ids is None:
+                    order_ids = owner_orders[order.owner_id] = {}
+                order_ids[order.id] = None
+
+    def _owner_order_removed(self, order):
+        with self._owners_lock:
+            order_ids = self.owner_orders[order.owner_id]
+            del order_ids[order.id]
+            if not order_ids:
+                del self.owner_orders[order.owner_id]
+
+    def _touch_level(self, type_, price):
+        # caller holds lock of the side, so only seq and pending updates need feed lock
+        asks_or_bids = self._get_side(type_)
+        if asks_or_bids.bisect_left(price) < self._visible_count(type_):
+            self._market_tables[type_] = None
+            self._market_data = None
+        with self._feed_lock:
+            self._seq += 1
+            if self._subscribers:
+                self._pending_updates.append(LevelUpdate(self._seq, type_, price, asks_or_bids[price].quantity))
+
+    def _commit(self):
+        # updates are pending only with subscribers, journal is thread-safe itself
+        if self._journal is None and not self._pending_updates:
+            return
+        with self._feed_lock:
+            super()._commit()
+
+    def _get_order_list(self, order_id) -> OrderList:
+        order_list = self.orders_meta.get(order_id)
+        if not isinstance(order_list, OrderList):
+            raise KeyError(f"Not exist {order_id=}")
+        return order_list
+
+    def order_id_by_client_id(self, client_id):
+        order_id = super().order_id_by_client_id(client_id)
+        if type(order_id) is object:  # reserved by adding in progress
+            raise KeyError(f"Not exist {client_id=}")
+        return order_id
+
+    def _locked_order_list(self, order_id):
+        """Find container of order and lock its side
+
+        :return: (lock context, OrderList)
+        """
+        while True:
+            order_list = self._get_order_list(order_id)
+            lock = self._locks_for_type(order_list.order_type_meta)
+            lock.__enter__()
+            if self.orders_meta.get(order_id) is order_list:
+                return lock, order_list
+            # order was removed or moved while waiting for lock
+            lock.__exit__(None, None, None)
+
+    @property
+    def market_data(self):
+        market_data = self._market_data
+        if market_data is not None:
+            return market_data
+        with self._all_locks():
+            return OrderBook.market_data.fget(self)
+
+    def encoded_market_data(self, encoding="json"):
+        cached = self._encoded_market_data.get(encoding)
+        if cached is not None and cached[0] is self._market_data:
+            return cached[1]
+        # encoders read levels, so buffer is built under both locks
+        with self._all_locks():
+            return super().encoded_market_data(encoding)
+
+    def depth(self, side, n):
+        with self._locks_for_type(side):
+            return super().depth(side, n)
+
+    def depth_arrays(self, side, n=None):
+        with self._locks_for_type(side):
+            return super().depth_arrays(side, n)
+
+    def levels_between(self, side, lo=None, hi=None):
+        with self._locks_for_type(side):
+            return super().levels_between(side, lo, hi)
+
+    def quantity_up_to(self, side, price):
+        with self._locks_for_type(side):
+            return super().quantity_up_to(side, price)
+
+    def cancel_range(self, side, lo=None, hi=None):
+        with self._locks_for_type(side):
+            return super().cancel_range(side, lo, hi)
+
+    def add_order(self, order):
+        with self._locks_for_type(getattr(order, "type", None)):
+            return super().add_order(order)
+
+    def add_orders(self, orders):
+        with self._all_locks():
+            return super().add_orders(orders)
+
+    def remove_order(self, order_id):
+        lock, order_list = self._locked_order_list(order_id)
+        try:
+            self._remove_level_orders(order_list, (order_id,))
+            self._commit()
+        finally:
+            lock.__exit__(None, None, None)
+
+    def amend_order(self, order_id, new_volume=None, new_price=None):
+        lock, _ = self._locked_order_list(order_id)
+        try:
+            return super().amend_order(order_id, new_volume, new_price)
+        finally:
+            lock.__exit__(None, None, None)
+
+    def remove_orders(self, order_ids):
+        with self._all_locks():
+            return super().remove_orders(order_ids)
+
+    def get_order_by(self, order_id):
+        # lock-free: dict lookups are atomic, order can be removed concurrently only
+        order_list = self._get_order_list(order_id)
+        try:
+            return order_list.get_order(order_id)
+        except Exception:
+            raise KeyError(f"Not exist {order_id=}")
+
+    def orders_by_owner(self, owner_id):
+        with self._owners_lock:
+            order_ids = list(self.owner_orders.get(owner_id, ()))
+        orders = []
+        for order_id in order_ids:
+            try:
+                orders.append(self._get_order_list(order_id).get_order(order_id))
+            except Exception:  # removed concurrently
+                pass
+        return orders
+
+    def cancel_all(self, owner_id, side=None):
+        with self._all_locks():
+            return super().cancel_all(owner_id, side)
+
+    def expire_orders(self, now=None):
+        with self._all_locks():
+            return super().expire_orders(now)
+
+    def snapshot(self, depth=None):
+        with self._all_locks():
+            return super().snapshot(depth)
+
+    def write_snapshot(self):
+        with self._all_locks():
+            return super().write_snapshot()
@@ -0,0 +1,310 @@
+"""asyncio TCP/Unix socket gateway for OrderBook
+
+Frame: <payload length: u32><payload>, payload is encoded by journal.encode_values
+Request payload: request_id, op, *args
+    Op.ADD       price, volume, type, owner_id, id (None -> generated by server)
+    Op.CANCEL    id
+    Op.GET       id
+    Op.SNAPSHOT  - (market_data of OrderBook)
+Frames longer than max_frame_size close the connection, not decodable request is answered by ERROR with
+request_id None.
+Response payload: request_id, status, *values
+    Status.OK     ADD: id, then (price, volume, maker_order_id, maker_status) for every trade
+                  CANCEL: -
+                  GET: price, volume, type, owner_id, id, ts
+                  SNAPSHOT: seq, count of asks, (price, quantity) for every ask, count of bids, (price, quantity)...
+    Status.ERROR  error message
+
+Usage: python gateway.py [--host 127.0.0.1] [--port 5555] [--unix PATH] [--trading-pair BTC_USD] [--ticks] [--matching]
+"""
+import argparse
+import asyncio
+import itertools
+import struct
+
+from journal import decode_values, encode_values
+from order_book import Order, OrderBook, TickOrder
+
+_HEADER = struct.Struct("<I")
+MAX_FRAME_SIZE = 1 << 20
+
+
+class Op:
+    ADD = 1
+    CANCEL = 2
+    GET = 3
+    SNAPSHOT = 4
+
+
+class Status:
+    OK = 0
+    ERROR = 1
+
+
+def _frame(values) -> bytes:
+    payload = encode_values(values)
+    return _HEADER.pack(len(payload)) + payload
+
+
+class FrameTooLargeError(Exception):
+    pass
+
+
+async def _read_payload(reader, max_frame_size=MAX_FRAME_SIZE):
+    """Return payload of next frame or None on end of stream
+
+    :raise FrameTooLargeError: length from header is bigger than max_frame_size (payload is not read)
+    """
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        size, = _HEADER.unpack(header)
+        if size > max_frame_size:
+            raise FrameTooLargeError(f"Frame is too large {size=}, {max_frame_size=}")
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+async def _read_frame(reader, max_frame_size=MAX_FRAME_SIZE):
+    """Return decoded values of next frame or None on end of stream"""
+    payload = await _read_payload(reader, max_frame_size)
+    return None if payload is None else decode_values(payload)
+
+
+class OrderGateway:
+    """Serve OrderBook requests over socket
+
+    Note:
+        All changes are applied by one writer task in micro-batches (up to batch_size queued requests at once),
+        so OrderBook is never changed concurrently. SNAPSHOT requests are answered by connection task from
+        cached market_data without waiting for the queue, writer task applies every batch synchronously,
+        so reads never see half-applied batch.
+        Backpressure: the queue is bounded (max_queue) and every connection has at most max_inflight
+        not answered requests, full queue or slow client stop reading of its socket, so latency of queued
+        requests stays bounded under load spikes instead of growing with unbounded buffers.
+
+    Args:
+        order_book (OrderBook): served OrderBook
+        max_queue (int, optional): max count of queued change requests of all connections
+        batch_size (int, optional): max count of requests applied by writer task at once
+        max_inflight (int, optional): max count of not answered requests per connection
+        max_frame_size (int, optional): max size of request payload in bytes, bigger frame closes connection
+    """
+
+    def __init__(self, order_book: OrderBook, max_queue=10000, batch_size=256, max_inflight=1000,
+                 max_frame_size=MAX_FRAME_SIZE):
+        self.order_book = order_book
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        self.max_frame_size = max_frame_size
+        self._queue = asyncio.Queue(max_queue)
+        self._server = None
+        self._writer_task = None
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Start listening on TCP host:port or on Unix socket path (if path is set)"""
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_client, path)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port)
+        return self
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def _handle_client(self, reader, writer):
+        inflight = asyncio.Semaphore(self.max_inflight)
+        try:
+            while True:
+                payload = await _read_payload(reader, self.max_frame_size)
+                if payload is None:
+                    break
+                try:
+                    request_id, op, *args = decode_values(payload)
+                except Exception as e:
+                    writer.write(_frame([None, Status.ERROR, f"Invalid request: {e}"]))
+                    await writer.drain()
+                    continue
+                if op == Op.SNAPSHOT:
+                    writer.write(_frame([request_id, Status.OK, *self._snapshot_values()]))
+                else:
+                    await inflight.acquire()
+                    await self._queue.put((writer, inflight, request_id, op, args))
+                # slow client stops only its own connection
+                await writer.drain()
+        except FrameTooLargeError as e:
+            writer.write(_frame([None, Status.ERROR, str(e)]))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _writer_loop(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            for writer, inflight, request_id, op, args in batch:
+                try:
+                    response = [request_id, Status.OK, *self._apply(op, args)]
+                except Exception as e:
+                    response = [request_id, Status.ERROR, str(e)]
+                if not writer.is_closing():
+                    writer.write(_frame(response))
+                inflight.release()
+            # give connection tasks a chance to read and to answer snapshots between batches
+            await asyncio.sleep(0)
+
+    def _apply(self, op, args):
+        order_book = self.order_book
+        if op == Op.ADD:
+            price, volume, type_, owner_id, order_id = args
+            order_cls = TickOrder if order_book.use_ticks else Order
+            if order_id is None:
+                order = order_cls(order_book.trading_pair, price, volume, type_, owner_id)
+            else:
+                order = order_cls(order_book.trading_pair, price, volume, type_, owner_id, order_id)
+            trades = order_book.add_order(order)
+            return [order.id, *itertools.chain.from_iterable(
+                (trade.price, trade.volume, trade.maker_order_id, trade.maker_status) for trade in trades
+            )]
+        if op == Op.CANCEL:
+            order_book.remove_order(args[0])
+            return []
+        if op == Op.GET:
+            order = order_book.get_order_by(args[0])
+            return [order.price, order.volume, order.type, order.owner_id, order.id, order.ts]
+        raise Exception(f"Not supported {op=}")
+
+    def _snapshot_values(self):
+        market_data = self.order_book.market_data
+        values = [self.order_book.seq]
+        for side in ("asks", "bids"):
+            values.append(len(market_data[side]))
+            for level in market_data[side]:
+                values.append(level["price"])
+                values.append(level["quantity"])
+        return values
+
+
+class GatewayClient:
+    """Pipelined client of OrderGateway, many requests can wait for responses at once
+
+    Use GatewayClient.connect(...) for creation
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._request_ids = itertools.count()
+        self._futures = {}  # request_id -> Future
+        self._reader_task = asyncio.create_task(self._reader_loop())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=5555, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _reader_loop(self):
+        try:
+            while True:
+                response = await _read_frame(self._reader)
+                if response is None:
+                    break
+                request_id, status, *values = response
+                future = self._futures.pop(request_id, None)
+                # request was cancelled (or timed out) by caller, or error is not related to request (id None)
+                if future is None or future.done():
+                    continue
+                if status == Status.OK:
+                    future.set_result(values)
+                else:
+                    future.set_exception(Exception(values[0]))
+        finally:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
+            self._futures.clear()
+
+    async def request(self, op, *args):
+        """Send request and wait response values
+
+        :raise ConnectionError: connection is closed
+        """
+        if self._reader_task.done():
+            raise ConnectionError("Connection closed")
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request_id] = future
+        self._writer.write(_frame([request_id, op, *args]))
+        await self._writer.drain()
+        return await future
+
+    async def add_order(self, price, volume, type_, owner_id, order_id=None):
+        """:return: (order id, [(price, volume, maker_order_id, maker_status), ...])"""
+        order_id, *trades = await self.request(Op.ADD, price, volume, type_, owner_id, order_id)
+        return order_id, [tuple(trades[i:i + 4]) for i in range(0, len(trades), 4)]
+
+    async def cancel_order(self, order_id):
+        await self.request(Op.CANCEL, order_id)
+
+    async def get_order(self, order_id):
+        """:return: (price, volume, type, owner_id, id, ts)"""
+        return tuple(await self.request(Op.GET, order_id))
+
+    async def market_data(self):
+        """:return: (seq, {"asks": [{"price": ..., "quantity": ...}, ...], "bids": [...]})"""
+        values = await self.request(Op.SNAPSHOT)
+        seq, pos = values[0], 1
+        market_data = {}
+        for side in ("asks", "bids"):
+            count = values[pos]
+            levels = values[pos + 1:pos + 1 + count * 2]
+            market_data[side] = [{"price": levels[i], "quantity": levels[i + 1]} for i in range(0, len(levels), 2)]
+            pos += 1 + count * 2
+        return seq, market_data
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        await self._reader_task
+
+
+async def _serve(args):
+    order_book = OrderBook(args.trading_pair, use_ticks=args.ticks, matching=args.matching)
+    gateway = await OrderGateway(order_book).start(args.host, args.port, args.unix)
+    print(f"Listening on {gateway.address}", flush=True)
+    await gateway.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--unix", default=None, help="path of Unix socket (instead of TCP)")
+    parser.add_argument("--trading-pair", default="BTC_USD")
+    parser.add_argument("--ticks", action="store_true", help="OrderBook with use_ticks=True")
+    parser.add_argument("--matching", action="store_true", help="OrderBook with matching=True")
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
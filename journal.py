@@ -0,0 +1,250 @@
+"""Append-only binary journal and snapshots for OrderBook
+
+Directory layout:
+    journal-<first seq>.bin - segments of journal, new segment is started on every open and snapshot
+    snapshot.bin - latest full snapshot, covers all records with seq < snapshot seq
+
+Record frame: <payload length: u32><crc32 of payload: u32><payload>
+Payload: values encoded by encode_values, first values are record type and seq
+"""
+import os
+import struct
+import threading
+import zlib
+from decimal import Decimal
+
+_INT = struct.Struct("<q")
+_LEN = struct.Struct("<I")
+_FRAME = struct.Struct("<II")
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".bin"
+SNAPSHOT_NAME = "snapshot.bin"
+
+
+class RecordType:
+    CONFIG = 1
+    ADD = 2
+    CANCEL = 3
+    FILL = 4  # order_id, rest volume in units of order (0 -> order was filled completely)
+    END = 5
+    AMEND = 6  # volume of order was reduced in place: order_id, rest volume in units of order
+    LEVEL = 7  # snapshot only, formatting of level: type, price key, *OrderList.format_state()
+
+
+def encode_values(values) -> bytes:
+    """Encode list of None/int/str/bytes/Decimal values to compact bytes"""
+    out = bytearray()
+    for value in values:
+        if value is None:
+            out += b"N"
+        elif isinstance(value, int):
+            if -2 ** 63 <= value < 2 ** 63:
+                out += b"i"
+                out += _INT.pack(value)
+            else:
+                raw = value.to_bytes(value.bit_length() // 8 + 1, "little", signed=True)
+                out += b"I"
+                out += _LEN.pack(len(raw))
+                out += raw
+        elif isinstance(value, str):
+            raw = value.encode()
+            out += b"s"
+            out += _LEN.pack(len(raw))
+            out += raw
+        elif isinstance(value, bytes):
+            out += b"b"
+            out += _LEN.pack(len(value))
+            out += value
+        elif isinstance(value, Decimal):
+            raw = str(value).encode()
+            out += b"d"
+            out += _LEN.pack(len(raw))
+            out += raw
+        else:
+            raise Exception(f"Not supported type for encoding {value=}")
+    return bytes(out)
+
+
+def decode_values(data) -> list:
+    """Decode bytes from encode_values back to list of values"""
+    data = memoryview(data)
+    values = []
+    pos = 0
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        if tag == ord("N"):
+            values.append(None)
+            continue
+        if tag == ord("i"):
+            values.append(_INT.unpack_from(data, pos)[0])
+            pos += _INT.size
+            continue
+        size = _LEN.unpack_from(data, pos)[0]
+        pos += _LEN.size
+        raw = bytes(data[pos:pos + size])
+        pos += size
+        if tag == ord("I"):
+            values.append(int.from_bytes(raw, "little", signed=True))
+        elif tag == ord("s"):
+            values.append(raw.decode())
+        elif tag == ord("b"):
+            values.append(raw)
+        elif tag == ord("d"):
+            values.append(Decimal(raw.decode()))
+        else:
+            raise Exception(f"Not supported tag for decoding {tag=}")
+    return values
+
+
+def _frame(values) -> bytes:
+    payload = encode_values(values)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path):
+    """Read values of all valid records from file, reading stops on first torn or corrupted record"""
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + _FRAME.size <= len(data):
+        size, crc = _FRAME.unpack_from(data, pos)
+        payload = data[pos + _FRAME.size:pos + _FRAME.size + size]
+        if len(payload) != size or zlib.crc32(payload) != crc:
+            return
+        yield decode_values(payload)
+        pos += _FRAME.size + size
+
+
+class Journal:
+    """Append-only journal of OrderBook changes with snapshots
+
+    Note:
+        Records are buffered and written to file on commit (once per OrderBook operation).
+        append/commit are thread-safe
+
+    Args:
+        path (str): directory for journal segments and snapshot
+        fsync (bool, optional): call os.fsync on every commit
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+        self.next_seq = 0
+        self._file = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._config = None
+        segments = self.segments()
+        if segments:
+            # continue numbering after last valid record
+            for values in read_frames(self._segment_path(segments[-1])):
+                self.next_seq = values[1] + 1
+            self.next_seq = max(self.next_seq, segments[-1])
+        snapshot_seq = self.snapshot_seq()
+        if snapshot_seq is not None:
+            self.next_seq = max(self.next_seq, snapshot_seq)
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.path, f"{SEGMENT_PREFIX}{first_seq:020d}{SEGMENT_SUFFIX}")
+
+    def segments(self):
+        """First seq of every journal segment in directory (sorted)"""
+        return sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.path)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def is_empty(self):
+        return not self.segments() and self.snapshot_seq() is None
+
+    def open_segment(self, config):
+        """Start new segment for writing, first record of segment is CONFIG with config values"""
+        self.close()
+        self._config = list(config)
+        self._file = open(self._segment_path(self.next_seq), "ab")
+        self.append(RecordType.CONFIG, *self._config)
+        self.commit()
+
+    def append(self, record_type, *values):
+        with self._lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self._buffer.append(_frame((record_type, seq) + values))
+        return seq
+
+    def commit(self):
+        with self._lock:
+            if not self._buffer:
+                return None
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+
+    def write_snapshot(self, config, records):
+        """Write full snapshot atomically, start new segment and remove segments covered by snapshot
+
+        :param config: values of CONFIG record
+        :param records: iterable of (record_type, values) with state of OrderBook
+        """
+        self.commit()
+        snapshot_seq = self.next_seq
+        tmp_path = os.path.join(self.path, SNAPSHOT_NAME + ".tmp")
+        count = 0
+        with open(tmp_path, "wb") as f:
+            f.write(_frame((RecordType.CONFIG, snapshot_seq) + tuple(config)))
+            for record_type, values in records:
+                f.write(_frame((record_type, snapshot_seq) + tuple(values)))
+                count += 1
+            f.write(_frame((RecordType.END, snapshot_seq, count)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, SNAPSHOT_NAME))
+
+        self.open_segment(config)
+        for first_seq in self.segments():
+            if first_seq < snapshot_seq:
+                os.remove(self._segment_path(first_seq))
+        return snapshot_seq
+
+    def read_snapshot(self):
+        """Return (snapshot seq, config values, [(record_type, values), ...]) or None if no valid snapshot"""
+        path = os.path.join(self.path, SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return None
+        frames = list(read_frames(path))
+        if not frames or frames[0][0] != RecordType.CONFIG or frames[-1][0] != RecordType.END \
+                or frames[-1][2] != len(frames) - 2:
+            raise Exception(f"Snapshot is corrupted {path=}")
+        records = [(values[0], values[2:]) for values in frames[1:-1]]
+        return frames[0][1], frames[0][2:], records
+
+    def snapshot_seq(self):
+        path = os.path.join(self.path, SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return None
+        for values in read_frames(path):
+            return values[1]
+        return None
+
+    def read_records(self, from_seq=0):
+        """Iterate (record_type, seq, values) of journal records with seq >= from_seq"""
+        segments = self.segments()
+        for idx, first_seq in enumerate(segments):
+            if idx + 1 < len(segments) and segments[idx + 1] <= from_seq:
+                continue
+            for values in read_frames(self._segment_path(first_seq)):
+                if values[1] >= from_seq:
+                    yield values[0], values[1], values[2:]
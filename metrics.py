@@ -0,0 +1,241 @@
+"""Opt-in instrumentation of OrderBook: operation counters, latency histograms and Prometheus export
+
+OrderBook(..., instrument=True) switches instance to instrumented subclass of its class, so not instrumented
+OrderBooks run exactly the same code as without this module.
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BUCKET_BITS = 5  # 32 sub-buckets per power of two -> values are recorded with <= 1/16 relative error
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_HALF = _SUB_BUCKETS // 2
+_MAX_BIT_LENGTH = 64
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999))
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of non-negative int values (latencies in ns)
+
+    Note:
+        Values < 2 ** SUB_BUCKET_BITS are recorded exactly, bigger values fall into buckets of width
+        value / 2 ** (SUB_BUCKET_BITS - 1), so relative error is bounded for all magnitudes.
+        Recording is O(1) with fixed memory (~1000 counters)
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * ((_MAX_BIT_LENGTH - SUB_BUCKET_BITS + 2) * _HALF)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value):
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return shift * _HALF + (value >> shift)
+
+    @staticmethod
+    def bucket_lowest(index):
+        """Lowest value which falls into bucket with index"""
+        if index < _SUB_BUCKETS:
+            return index
+        shift = index // _HALF - 1
+        return (index - shift * _HALF) << shift
+
+    def record(self, value):
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        self.counts[value if shift <= 0 else shift * _HALF + (value >> shift)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Highest value of bucket with q-th recorded value (not bigger than max recorded value)"""
+        if not self.count:
+            return 0
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_lowest(index + 1) - 1, self.max)
+        return self.max
+
+    def cumulative_counts(self, bounds):
+        """Count of values <= bound for every bound of sorted bounds (bounds are rounded to buckets)"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            last = self.bucket_index(bound)
+            while index <= last:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+class OrderBookMetrics:
+    """Latency histograms and error counters by operation name
+
+    Note:
+        Not locked, under many writer threads (ConcurrentOrderBook) counters can miss rare concurrent increments
+    """
+
+    def __init__(self, operations):
+        self.histograms = {operation: LatencyHistogram() for operation in operations}
+        self.errors = dict.fromkeys(operations, 0)
+
+    def operations_stats(self):
+        """Stats of operations which were called at least once"""
+        result = {}
+        for operation, histogram in self.histograms.items():
+            if not histogram.count:
+                continue
+            stats = {"count": histogram.count, "errors": self.errors[operation],
+                     "mean_ns": histogram.total // histogram.count}
+            for name, q in PERCENTILES:
+                stats[f"{name}_ns"] = histogram.percentile(q)
+            stats["max_ns"] = histogram.max
+            result[operation] = stats
+        return result
+
+
+def _timed(operation, method):
+    perf_counter_ns = time.perf_counter_ns
+
+    def wrapper(self, *args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            self._metrics.errors[operation] += 1
+            raise
+        finally:
+            self._metrics.histograms[operation].record(perf_counter_ns() - start)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+# method name -> operation name
+TIMED_METHODS = {
+    "add_order": "add",
+    "add_orders": "add_batch",
+    "remove_order": "cancel",
+    "amend_order": "amend",
+    "remove_orders": "cancel_batch",
+    "cancel_all": "cancel_all",
+    "cancel_range": "cancel_range",
+    "expire_orders": "expire",
+    "get_order_by": "lookup",
+    "snapshot": "snapshot",
+    "encoded_market_data": "encoded_market_data",
+}
+TIMED_PROPERTIES = {"market_data": "market_data"}
+OPERATIONS = tuple(TIMED_METHODS.values()) + tuple(TIMED_PROPERTIES.values())
+
+_instrumented_classes = {}
+
+
+def instrumented_class(cls):
+    """Subclass of OrderBook class cls which records latency of every public operation into self._metrics"""
+    instrumented = _instrumented_classes.get(cls)
+    if instrumented is None:
+        namespace = {name: _timed(operation, getattr(cls, name)) for name, operation in TIMED_METHODS.items()}
+        for name, operation in TIMED_PROPERTIES.items():
+            namespace[name] = property(_timed(operation, getattr(cls, name).fget))
+        instrumented = _instrumented_classes[cls] = type(f"Instrumented{cls.__name__}", (cls,), namespace)
+    return instrumented
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# histogram buckets for export: 1us .. ~1s by powers of 2
+PROMETHEUS_BOUNDS_NS = [1000 << i for i in range(21)]
+
+
+def to_prometheus(order_books):
+    """Stats of OrderBooks in Prometheus text exposition format
+
+    :param order_books: iterable of OrderBooks (stats() of every book is read once)
+    """
+    counters = ["# HELP orderbook_operations_total Count of OrderBook operations",
+                "# TYPE orderbook_operations_total counter"]
+    errors = ["# HELP orderbook_operation_errors_total Count of OrderBook operations failed with error",
+              "# TYPE orderbook_operation_errors_total counter"]
+    latencies = ["# HELP orderbook_operation_latency_seconds Latency of OrderBook operations",
+                 "# TYPE orderbook_operation_latency_seconds histogram"]
+    levels = ["# HELP orderbook_levels Count of price levels", "# TYPE orderbook_levels gauge"]
+    orders = ["# HELP orderbook_orders Count of resting orders", "# TYPE orderbook_orders gauge"]
+    max_level = ["# HELP orderbook_max_level_orders Count of orders at the largest price level",
+                 "# TYPE orderbook_max_level_orders gauge"]
+    for order_book in order_books:
+        stats = order_book.stats()
+        pair = f"trading_pair=\"{_escape(stats['trading_pair'])}\""
+        for side in ("asks", "bids"):
+            levels.append(f"orderbook_levels{{{pair},side=\"{side}\"}} {stats[side]['levels']}")
+            orders.append(f"orderbook_orders{{{pair},side=\"{side}\"}} {stats[side]['orders']}")
+            max_level.append(f"orderbook_max_level_orders{{{pair},side=\"{side}\"}} "
+                             f"{stats[side]['max_level_orders']}")
+        metrics = order_book._metrics
+        if metrics is None:
+            continue
+        for operation, histogram in metrics.histograms.items():
+            labels = f"{pair},operation=\"{operation}\""
+            counters.append(f"orderbook_operations_total{{{labels}}} {histogram.count}")
+            errors.append(f"orderbook_operation_errors_total{{{labels}}} {metrics.errors.get(operation, 0)}")
+            for bound, count in zip(PROMETHEUS_BOUNDS_NS, histogram.cumulative_counts(PROMETHEUS_BOUNDS_NS)):
+                latencies.append(f"orderbook_operation_latency_seconds_bucket{{{labels},le=\"{bound / 1e9:g}\"}} "
+                                 f"{count}")
+            latencies.append(f"orderbook_operation_latency_seconds_bucket{{{labels},le=\"+Inf\"}} "
+                             f"{histogram.count}")
+            latencies.append(f"orderbook_operation_latency_seconds_sum{{{labels}}} {histogram.total / 1e9:g}")
+            latencies.append(f"orderbook_operation_latency_seconds_count{{{labels}}} {histogram.count}")
+    return "\n".join(counters + errors + latencies + levels + orders + max_level) + "\n"
+
+
+def write_prometheus(path, order_books):
+    """Write stats atomically to file (for node_exporter textfile collector)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(to_prometheus(order_books))
+    os.replace(tmp_path, path)
+
+
+def start_metrics_server(order_books, host="127.0.0.1", port=9100):
+    """Serve stats of OrderBooks on http://host:port/metrics from daemon thread
+
+    Note:
+        Stats are read while OrderBooks are changed by other threads, counts of levels/orders are read from
+        copies of containers, so they are consistent per container but not across whole OrderBook
+    :return: ThreadingHTTPServer, call shutdown() to stop
+    """
+    order_books = list(order_books)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = to_prometheus(order_books).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,11 +1,32 @@
+import gc
+import json
 import time
+import heapq
+import struct
 import uuid
+import operator
+import itertools
+import threading
 from decimal import Decimal
-from collections import UserList
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
+from itertools import islice
+from contextlib import contextmanager
 
 from sortedcontainers import SortedDict
 
+try:
+    import numpy as np
+except ImportError:  # optional, required only for OrderBook.depth_arrays
+    np = None
+
+try:
+    import orjson
+except ImportError:  # optional, faster JSON encoding of market data
+    orjson = None
+
+from journal import Journal, RecordType
+from metrics import OPERATIONS, OrderBookMetrics, instrumented_class
+
 
 class SortedDefaultDict(SortedDict):
     def __init__(self, default_factory=None, *args, **kwargs):
@@ -17,6 +38,66 @@ class SortedDefaultDict(SortedDict):
         return result
 
 
+PRECISION = 8
+TICKS_PER_UNIT = 10 ** PRECISION
+
+
+def to_ticks(value: Decimal) -> int:
+    """Convert decimal with max PRECISION places to integer ticks"""
+    return int(value.scaleb(PRECISION))
+
+
+def from_ticks(ticks: int, places=PRECISION) -> Decimal:
+    """Convert integer ticks back to decimal with given count of places after point"""
+    return Decimal(ticks // 10 ** (PRECISION - places)).scaleb(-places)
+
+
+@contextmanager
+def _gc_paused():
+    """Disable cyclic gc for bulk allocation of many containers (orders, nodes) at once"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _places(value: Decimal) -> int:
+    return -value.as_tuple().exponent
+
+
+def _max_places(places, other):
+    """Places of result of decimal arithmetic, None -> places are unknown (ticks)"""
+    if places is None or other is None:
+        return None
+    return max(places, other)
+
+
+def _tick_places(ticks: int) -> int:
+    """Min count of places after point for exact representation of ticks"""
+    places = PRECISION
+    while places > 0 and ticks % 10 ** (PRECISION - places + 1) == 0:
+        places -= 1
+    return places
+
+
+_quantity_of = operator.attrgetter("quantity")
+
+
+class OrderBookBatchError(Exception):
+    """Batch operation was rejected, nothing was changed
+
+    Args:
+        errors (dict): index of item in batch -> error message
+    """
+
+    def __init__(self, errors):
+        super().__init__(f"Batch rejected, invalid items: {errors}")
+        self.errors = errors
+
+
 class OrderType:
     ASK = "ask"
     BID = "bid"
@@ -29,7 +110,83 @@ class OrderStatus:
     CLOSE = "close"
 
 
+def _reduce_slots(self):
+    # frozen instance without __dict__ can't be restored by default pickle protocol
+    return self.__class__, tuple(getattr(self, f.name) for f in fields(self))
+
+
+def _add_slots(cls):
+    """Recreate dataclass with __slots__ and without per-instance __dict__
+
+    Note:
+        Backport of dataclass(slots=True) (python>=3.10), instances are pickled by __init__ args
+    """
+    cls_dict = dict(cls.__dict__)
+    cls_dict.setdefault("__reduce__", _reduce_slots)
+    field_names = tuple(f.name for f in fields(cls))
+    inherited_slots = {name for base in cls.__mro__[1:] for name in getattr(base, "__slots__", ())}
+    cls_dict["__slots__"] = tuple(name for name in field_names if name not in inherited_slots)
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def _new_order_id() -> bytes:
+    return uuid.uuid4().bytes
+
+
+class SequentialIds:
+    """Order id generator: compact monotonically increasing ints start, start + 1, ... (thread-safe)"""
+    __slots__ = ("_counter",)
+
+    def __init__(self, start=1):
+        self._counter = itertools.count(start)
+
+    def __call__(self) -> int:
+        return next(self._counter)
+
+
+class SnowflakeIds:
+    """Order id generator: 64-bit ints unique across workers, increasing within worker (thread-safe)
+
+    Note:
+        Layout: <41 bits: ms since epoch><10 bits: worker id><12 bits: sequence in ms>.
+        When sequence of ms is exhausted or clock goes back ids continue in next ms, so they never repeat
+
+    Args:
+        worker_id (int): unique id of process/book generating ids, 0 <= worker_id < 1024
+        epoch_ms (int, optional): start of ms counting (unix time in ms)
+    """
+    EPOCH_MS = 1577836800000  # 2020-01-01 UTC
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(self, worker_id=0, epoch_ms=EPOCH_MS):
+        if not 0 <= worker_id < 1 << self.WORKER_BITS:
+            raise Exception(f"Not supported {worker_id=}")
+        self._worker = worker_id << self.SEQUENCE_BITS
+        self._epoch_ms = epoch_ms
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000 - self._epoch_ms
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if not self._sequence:
+                    self._last_ms += 1
+            return self._last_ms << (self.WORKER_BITS + self.SEQUENCE_BITS) | self._worker | self._sequence
+
+
 # Simplest way, Its use some model from Django\FastApi with validating method =)
+@_add_slots
 @dataclass(frozen=True)
 class Order:
     trading_pair: str
@@ -37,8 +194,12 @@ class Order:
     volume: Decimal
     type: str
     owner_id: str
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    id: bytes = field(default_factory=_new_order_id)  # any hashable id (16 bytes uuid4 by default)
     ts: int = field(default_factory=time.time_ns)
+    client_id: str = None  # optional external id, resolved by OrderBook.order_id_by_client_id
+    # optional time in ns (time.time_ns) when resting order is removed by OrderBook.expire_orders,
+    # expire_ts <= ts -> immediate-or-cancel: not matched rest isn't stored by matching OrderBook
+    expire_ts: int = None
 
     def __post_init__(self):
         if not isinstance(self.price, Decimal) or not isinstance(self.volume, Decimal):
@@ -52,65 +213,436 @@ class Order:
             raise Exception(f"Try to create invalid order. Set invalid {self.volume=}")
 
     def __eq__(self, other):
-        if isinstance(other, str):
-            return other == self.id
-        if isinstance(other, self.__class__):
+        if isinstance(other, Order):
             return self.id == other.id
-        return False
+        return other == self.id
 
     def early_than(self, order: "Order"):
         return self.ts < order.ts
 
 
-class OrderList(UserList):
-    # self.data -> list .... TODO: change to another more faster class.
-    #  Need push and pop with O(1) and slow insertion by ordered timestamp like queue
+@_add_slots
+@dataclass(frozen=True)
+class TickOrder(Order):
+    """Order with price and volume already scaled to integer ticks (value * TICKS_PER_UNIT)
+
+    Note:
+        Skip decimal validation, supported only by OrderBook with use_ticks=True
+    """
+
+    def __post_init__(self):
+        if type(self.price) is not int or type(self.volume) is not int:
+            raise Exception("Price and Volume should be int ticks")
+        if self.price <= 0:
+            raise Exception(f"Try to create invalid order. Set invalid {self.price=}")
+        if self.volume <= 0:
+            raise Exception(f"Try to create invalid order. Set invalid {self.volume=}")
+
+
+@_add_slots
+@dataclass(frozen=True)
+class Trade:
+    """Trade between resting (maker) order and incoming (taker) order
+
+    Note:
+        price and volume are in OrderBook units (Decimal or ticks for use_ticks=True)
+        maker_status is OrderStatus.CLOSE when maker order was filled completely else OrderStatus.TRADE
+    """
+    trading_pair: str
+    price: Decimal
+    volume: Decimal
+    maker_order_id: bytes
+    taker_order_id: bytes
+    taker_type: str
+    maker_status: str
+    ts: int = field(default_factory=time.time_ns)
+
+
+_ORDER_CLASSES = (Order, TickOrder)
+
+
+def _order_to_values(order: Order):
+    return (_ORDER_CLASSES.index(type(order)),) + tuple(getattr(order, f.name) for f in fields(order))
+
+
+def _order_from_values(values) -> Order:
+    return _ORDER_CLASSES[values[0]](*values[1:])
+
+
+_ORDER_FIELDS = tuple(f.name for f in fields(Order))
+
 
+def _replace_order(order: Order, **changes) -> Order:
+    """Copy of order with changed fields (validated), ~2x faster than dataclasses.replace"""
+    return type(order)(*[changes[name] if name in changes else getattr(order, name) for name in _ORDER_FIELDS])
+
+
+@_add_slots
+@dataclass(frozen=True)
+class LevelUpdate:
+    """New aggregated quantity of level (0 -> level was removed)
+
+    Note:
+        price and quantity are in OrderBook units (Decimal or ticks for use_ticks=True)
+    """
+    seq: int
+    side: str
+    price: Decimal
+    quantity: Decimal
+
+
+class _OrderNode:
+    """Node of OrderList doubly linked queue"""
+
+    __slots__ = ("order", "volume", "prev", "next")
+
+    def __init__(self, order: Order, volume):
+        self.order = order
+        self.volume = volume
+        self.prev = None
+        self.next = None
+
+
+class OrderList:
     """OrderList support simple order processing for orders with same prices
 
     Note:
         When process first order -> set price for this container and order_type_meta -> any[OrderAction]
+        Orders are stored as FIFO queue (doubly linked list) with index by order id,
+        so append, cancel by id and get by id take O(1) and time priority is kept.
     """
 
+    __slots__ = ("price", "quantity", "order_type_meta", "_head", "_tail", "_nodes")
+
     def __init__(self):
-        super().__init__(self)
         self.price = None
         self.quantity = 0
         self.order_type_meta = None
+        self._head = None
+        self._tail = None
+        self._nodes = dict()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __bool__(self):
+        return bool(self._nodes)
+
+    def __contains__(self, order_id):
+        return order_id in self._nodes
+
+    def __iter__(self):
+        node = self._head
+        while node is not None:
+            yield node.order
+            node = node.next
+
+    @staticmethod
+    def price_key(order: Order):
+        """Price of order in units of this container (key for asks/bids)"""
+        return order.price
+
+    @staticmethod
+    def volume_key(order: Order):
+        """Volume of order in units of this container"""
+        return order.volume
+
+    @staticmethod
+    def volume_places(order: Order):
+        """Places of decimal volume of order (for same formatting in TickOrderList), None for this container"""
+        return None
+
+    @staticmethod
+    def order_with_volume(order: Order, volume, places=None) -> Order:
+        """Copy of order (same id and ts) with new volume in units of this container
+
+        :param places: places of decimal volume (TickOrderList only), by default min places of volume
+        """
+        return _replace_order(order, volume=volume)
 
     def _process_order(self, order: Order):
+        price, volume = order.price, order.volume
         if self.price is None and self.order_type_meta is None and self.quantity == 0:
-            self.price = order.price
+            self.price = price
             self.order_type_meta = order.type
 
-        if self.price == order.price:
-            self.quantity += order.volume
-            return
+        if self.price == price:
+            self.quantity += volume
+            return volume
 
         raise Exception(f"Invalid price or state for this order container. Curr data: {self.price=}, {self.quantity=}")
 
-    def _remove_process(self, order: Order):
-        if self.price == order.price \
-                and self.quantity > 0 \
-                and self.quantity >= order.volume:
-            self.quantity -= order.volume
+    def _remove_process(self, volume):
+        if self.quantity > 0 and self.quantity >= volume:
+            self.quantity -= volume
             return None
 
         raise Exception("Order not exist in this container")
 
-    def add_order(self, val):
-        self._process_order(val)
-        self.insert(len(self.data), val)
+    def format_price(self) -> str:
+        return str(self.price)
+
+    def format_quantity(self) -> str:
+        return str(self.quantity)
+
+    def format_state(self):
+        """Values which define format_price/format_quantity besides orders (price and quantity keep exponent of
+        decimal arithmetic), restored by set_format_state
+        """
+        return self.price, self.quantity
+
+    def set_format_state(self, price, quantity):
+        self.price, self.quantity = price, quantity
+
+    def add_order(self, val: Order):
+        if val.id in self._nodes:
+            raise Exception("Order exist in this orderList")
+        node = _OrderNode(val, self._process_order(val))
+        if self._tail is None:
+            self._head = node
+        else:
+            self._tail.next = node
+            node.prev = self._tail
+        self._tail = node
+        self._nodes[val.id] = node
+
+    def add_orders(self, orders):
+        """Append many orders in one pass, orders should be validated before"""
+        nodes, tail, process_order = self._nodes, self._tail, self._process_order
+        for order in orders:
+            if order.id in nodes:
+                raise Exception("Order exist in this orderList")
+            node = _OrderNode(order, process_order(order))
+            if tail is None:
+                self._head = node
+            else:
+                tail.next = node
+                node.prev = tail
+            tail = self._tail = node
+            nodes[order.id] = node
 
     def del_order(self, order_id):
-        if order_id in self.data:
-            idx = self.data.index(order_id)
-            order = self.data[idx]
-            self._remove_process(order)
-            del self.data[idx]
+        node = self._nodes.get(order_id)
+        if node is None:
+            raise Exception("Order not exist in this orderList")
+
+        self._remove_process(node.volume)
+        del self._nodes[order_id]
+        if node.prev is None:
+            self._head = node.next
+        else:
+            node.prev.next = node.next
+        if node.next is None:
+            self._tail = node.prev
+        else:
+            node.next.prev = node.prev
+        node.prev = node.next = None
+        return node.order
+
+    def reduce_order(self, order_id, volume, order: Order = None) -> Order:
+        """Decrease volume of order in place (time priority is kept)
+
+        :param order_id:
+        :param volume: new volume in units of this container, should be less than current and more than 0
+        :param order: updated order with this volume, copy of current order by default
+        :return: updated order
+        """
+        node = self._nodes.get(order_id)
+        if node is None:
+            raise Exception("Order not exist in this orderList")
+        if not 0 < volume < node.volume:
+            raise Exception(f"Invalid volume for reducing order. Curr data: {node.volume=}, {volume=}")
+        if order is None:
+            order = self.order_with_volume(node.order, volume)
+        self._remove_process(node.volume - volume)
+        node.volume = volume
+        node.order = order
+        return order
+
+    def fill(self, volume, places=None):
+        """Fill orders from head of queue by price-time priority
+
+        :param volume: volume for filling in units of this container
+        :param places: places of decimal volume (see volume_places)
+        :return: ([(maker_order, filled_volume, is_closed), ...], not filled volume)
+        """
+        fills = []
+        node = self._head
+        while node is not None and volume > 0:
+            next_node = node.next
+            if node.volume <= volume:
+                volume -= node.volume
+                fills.append((node.order, node.volume, True))
+                self.del_order(node.order.id)
+            else:
+                fills.append((self.reduce_order(node.order.id, node.volume - volume), volume, False))
+                volume = 0
+            node = next_node
+        return fills, volume
+
+    def get_order(self, order_id) -> Order:
+        node = self._nodes.get(order_id)
+        if node is None:
+            raise Exception("Order not exist in this orderList")
+        return node.order
+
+    def first(self) -> Order:
+        """Return the oldest order in queue (or None for empty container)"""
+        return self._head.order if self._head is not None else None
+
+
+class TickOrderList(OrderList):
+    """OrderList with price and quantity stored as integer ticks
+
+    Note:
+        Decimal orders are converted to ticks once on adding. Count of places of processed decimals is kept
+        for formatting, so format_price/format_quantity return same strings as OrderList with decimals
+    """
+
+    __slots__ = ("price_places", "quantity_places")
+
+    def __init__(self):
+        super().__init__()
+        self.price_places = PRECISION
+        self.quantity_places = None
+
+    @staticmethod
+    def price_key(order: Order):
+        if isinstance(order, TickOrder):
+            return order.price
+        return to_ticks(order.price)
+
+    @staticmethod
+    def volume_key(order: Order):
+        if isinstance(order, TickOrder):
+            return order.volume
+        return to_ticks(order.volume)
+
+    @staticmethod
+    def volume_places(order: Order):
+        if isinstance(order, TickOrder):
             return None
+        return _places(order.volume)
+
+    @staticmethod
+    def order_with_volume(order: Order, volume, places=None) -> Order:
+        if isinstance(order, TickOrder):
+            return _replace_order(order, volume=volume)
+        return _replace_order(order, volume=from_ticks(volume, _tick_places(volume) if places is None else places))
+
+    def fill(self, volume, places=None):
+        """Same as OrderList.fill, rest of partially filled decimal order keeps places of decimal subtraction
+        (max of places of order volume and filling volume), so formatting is the same as for decimals
+        """
+        fills = []
+        node = self._head
+        while node is not None and volume > 0:
+            next_node = node.next
+            order = node.order
+            if node.volume <= volume:
+                volume -= node.volume
+                fills.append((order, node.volume, True))
+                self.del_order(order.id)
+                places = _max_places(places, self.volume_places(order))
+            else:
+                rest_places = _max_places(places, self.volume_places(order))
+                rest = node.volume - volume
+                rest_order = self.reduce_order(order.id, rest, self.order_with_volume(order, rest, rest_places))
+                fills.append((rest_order, volume, False))
+                volume = 0
+            node = next_node
+        return fills, volume
+
+    def reduce_order(self, order_id, volume, order: Order = None) -> Order:
+        order = super().reduce_order(order_id, volume, order)
+        # reduced volume may need more places than added orders had, decimal order keeps places of its volume
+        places = _tick_places(volume) if isinstance(order, TickOrder) else _places(order.volume)
+        if places > self.quantity_places:
+            self.quantity_places = places
+        return order
+
+    def _process_order(self, order: Order):
+        if isinstance(order, TickOrder):
+            price, volume = order.price, order.volume
+            price_places = volume_places = PRECISION
+        else:
+            price, volume = to_ticks(order.price), to_ticks(order.volume)
+            price_places, volume_places = _places(order.price), _places(order.volume)
+
+        if self.price is None and self.order_type_meta is None and self.quantity == 0:
+            self.price = price
+            self.order_type_meta = order.type
+            self.price_places = price_places
+            # decimal quantity starts from int 0, so it never has positive exponent
+            self.quantity_places = max(volume_places, 0)
+
+        if self.price == price:
+            self.quantity += volume
+            if volume_places > self.quantity_places:
+                self.quantity_places = volume_places
+            return volume
+
+        raise Exception(f"Invalid price or state for this order container. Curr data: {self.price=}, {self.quantity=}")
+
+    def format_price(self) -> str:
+        return str(from_ticks(self.price, self.price_places))
+
+    def format_quantity(self) -> str:
+        return str(from_ticks(self.quantity, self.quantity_places))
+
+    def format_state(self):
+        return self.price_places, self.quantity_places
+
+    def set_format_state(self, price_places, quantity_places):
+        self.price_places, self.quantity_places = price_places, quantity_places
+
+
+def encode_market_data_json(order_book, market_data) -> bytes:
+    """market_data as compact JSON (orjson is used when installed, output is the same)"""
+    if orjson is not None:
+        return orjson.dumps(market_data)
+    return json.dumps(market_data, separators=(",", ":")).encode()
 
-        raise Exception("Order not exist in this orderList")
+
+# <asks count: u32><bids count: u32> then (<price ticks: i64><quantity ticks: i64>) per level, asks first
+_BINARY_HEADER = struct.Struct("<II")
+_INT64_MAX = 2 ** 63 - 1
+_DECIMAL_TICKS_PER_UNIT = Decimal(TICKS_PER_UNIT)
+
+
+def encode_market_data_binary(order_book, market_data) -> bytes:
+    """Visible levels in compact little-endian binary layout of ticks, see decode_market_data_binary
+
+    Note:
+        Built from levels directly (without parsing of market_data strings).
+        Price and quantity of level should be less than 2 ** 63 ticks (~9.2e10 units)
+    """
+    counts = (len(market_data["asks"]), len(market_data["bids"]))
+    values = []
+    for type_, count in zip((OrderType.ASK, OrderType.BID), counts):
+        for order_list in islice(order_book._get_side(type_).values(), count):
+            values.append(order_list.price)
+            values.append(order_list.quantity)
+    if not order_book.use_ticks:
+        values = list(map(round, map(_DECIMAL_TICKS_PER_UNIT.__mul__, values)))  # exact, faster than to_ticks
+    if values and max(values) > _INT64_MAX:
+        raise Exception("Level doesn't fit binary layout, price and quantity should be < 2 ** 63 ticks")
+    return struct.pack(f"<II{len(values)}q", *counts, *values)
+
+
+def decode_market_data_binary(buffer):
+    """:return: {"asks": [(price ticks, quantity ticks), ...], "bids": [...]}"""
+    asks_count, bids_count = _BINARY_HEADER.unpack_from(buffer)
+    levels = list(struct.iter_unpack("<qq", memoryview(buffer)[_BINARY_HEADER.size:]))
+    return {"asks": levels[:asks_count], "bids": levels[asks_count:asks_count + bids_count]}
+
+
+# encoding name -> callable(order_book, market_data) -> bytes, add own encoders here.
+# Encoder is called with consistent state (under locks of ConcurrentOrderBook) and shouldn't change order_book
+MARKET_DATA_ENCODERS = {
+    "json": encode_market_data_json,
+    "binary": encode_market_data_binary,
+}
 
 
 class OrderBook:
@@ -123,23 +655,207 @@ class OrderBook:
         trading_pair (str): name for trading pair. Like "BTC_USD"
         asks_count (int, optional): Total count of asks for visualize in market_data
         bids_count (int, optional): Total count of bids for visualize in market_data
+        use_ticks (bool, optional): Store prices and quantities as integer ticks (fixed point with PRECISION
+            places) instead of Decimal. Prices and quantities returned by depth/best_* are ticks in this mode,
+            market_data output is the same as for decimal mode
+        matching (bool, optional): Match incoming orders with opposite side by price-time priority,
+            crossing orders produce trades and only not filled rest of order is stored
+        journal_path (str, optional): Directory for append-only journal of all changes (see journal.Journal).
+            Should be empty, existing journal can be loaded by OrderBook.restore
+        instrument (bool, optional): Record count and latency of public operations (see metrics module and stats),
+            not instrumented OrderBook has no overhead
+        id_generator (callable, optional): Generator of ids for orders created by new_order, like SequentialIds()
+            or SnowflakeIds(worker_id), uuid4 bytes by default
     """
 
-    def __init__(self, trading_pair: str, asks_count=10, bids_count=10):
-        self.asks = SortedDefaultDict(OrderList)  # TODO: should be reversed
-        self.bids = SortedDefaultDict(OrderList)
-        self.orders_meta = dict()
+    def __init__(self, trading_pair: str, asks_count=10, bids_count=10, use_ticks=False, matching=False,
+                 journal_path=None, instrument=False, id_generator=None):
+        self.use_ticks = use_ticks
+        self.matching = matching
+        self._order_list_cls = TickOrderList if use_ticks else OrderList
+        self.asks = SortedDefaultDict(self._order_list_cls)
+        self.bids = SortedDefaultDict(self._order_list_cls, operator.neg)  # best (highest) bid first
+        self.orders_meta = dict()  # order_id -> OrderList with this order
+        self.client_ids = dict()  # client_id -> order_id, for resting orders with client_id only
+        self.owner_orders = dict()  # owner_id -> {order_id: None} (ordered set) of resting orders of owner
+        self.id_generator = id_generator or _new_order_id
+        # (expire_ts, n, order_id) of orders with expire_ts, removed orders are skipped on pop
+        self._expiry_heap = []
+        self._expiry_scheduled = dict()  # order_id -> expire_ts of its live entry in _expiry_heap
+        self._expiry_counter = itertools.count()
         self.trading_pair = trading_pair
         self.asks_count = asks_count
         self.bids_count = bids_count
+        # Top of book and market data caches. Refreshed only when add\remove touch top or visible levels
+        self._best = {OrderType.ASK: None, OrderType.BID: None}
+        self._market_tables = {OrderType.ASK: None, OrderType.BID: None}
+        self._market_data = None
+        self._encoded_market_data = {}  # encoding -> (market_data, memoryview of encoded market_data)
+        self._depth_arrays = {}  # (side, n) -> (seq, prices, quantities)
+        # Market data delta feed
+        self._seq = 0
+        self._subscribers = []
+        self._pending_updates = []
+        self._journal = None
+        if journal_path is not None:
+            journal = Journal(journal_path)
+            if not journal.is_empty():
+                raise Exception(f"Journal already exist, use OrderBook.restore({journal_path=})")
+            journal.open_segment(self._journal_config())
+            self._journal = journal
+        self._metrics = None
+        if instrument:
+            self._metrics = OrderBookMetrics(OPERATIONS)
+            self.__class__ = instrumented_class(type(self))
 
     def __to_market_table(self, asks_or_bids, count_of_items):
-        count_of_items = count_of_items if len(asks_or_bids) > count_of_items else len(asks_or_bids)
-        result = []
-        for i in range(count_of_items):
-            price, order_list = asks_or_bids.peekitem(i)
-            result.append({"price": str(price), "quantity": str(order_list.quantity)})
-        return result
+        return [
+            {"price": order_list.format_price(), "quantity": order_list.format_quantity()}
+            for order_list in islice(asks_or_bids.values(), count_of_items)
+        ]
+
+    def _get_side(self, type_) -> SortedDefaultDict:
+        if type_ == OrderType.ASK:
+            return self.asks
+        if type_ == OrderType.BID:
+            return self.bids
+        raise Exception(f"Not supported {type_=}")
+
+    def depth(self, side, n):
+        """Return top N levels of side from best price in one iterator pass
+
+        :param side: OrderType.ASK or OrderType.BID
+        :param n: max count of levels, None -> all levels
+        :return: [(price, quantity), ...]
+        """
+        return [(price, order_list.quantity) for price, order_list in islice(self._get_side(side).items(), n)]
+
+    def _irange(self, side, lo, hi):
+        """Iterate prices of side with lo <= price <= hi from best price, O(log n) + O(1) per price"""
+        asks_or_bids = self._get_side(side)
+        if side == OrderType.BID:
+            # bids are sorted by -price
+            return asks_or_bids.irange(hi, lo)
+        return asks_or_bids.irange(lo, hi)
+
+    def levels_between(self, side, lo=None, hi=None):
+        """Return levels of side with lo <= price <= hi from best price, O(log n + k)
+
+        :param side: OrderType.ASK or OrderType.BID
+        :param lo: min price (ticks for use_ticks=True), None -> without bound
+        :param hi: max price, None -> without bound
+        :return: [(price, quantity), ...]
+        """
+        asks_or_bids = self._get_side(side)
+        return [(price, asks_or_bids[price].quantity) for price in self._irange(side, lo, hi)]
+
+    def quantity_up_to(self, side, price):
+        """Total quantity of levels from best price up to price inclusive (asks: <= price, bids: >= price)
+
+        Note:
+            O(log n + k), k - count of summed levels
+        """
+        asks_or_bids = self._get_side(side)
+        # maximum of irange is compared by key, so it is the worst included price for both sides
+        return sum(asks_or_bids[level_price].quantity for level_price in asks_or_bids.irange(maximum=price))
+
+    def depth_arrays(self, side, n=None):
+        """Return top N levels of side from best price as NumPy arrays (see analytics module for helpers)
+
+        Note:
+            Arrays are int64 ticks for use_ticks=True and float64 otherwise. Arrays are cached until next change of
+            levels and shared between calls, so they are read-only. Requires numpy
+
+        :param side: OrderType.ASK or OrderType.BID
+        :param n: max count of levels, None -> all levels
+        :return: (prices, quantities)
+        """
+        if np is None:
+            raise Exception("depth_arrays requires numpy")
+        seq = self._seq
+        cached = self._depth_arrays.get((side, n))
+        if cached is not None and cached[0] == seq:
+            return cached[1], cached[2]
+        asks_or_bids = self._get_side(side)
+        count = len(asks_or_bids) if n is None else min(n, len(asks_or_bids))
+        dtype = np.int64 if self.use_ticks else np.float64
+        keys = asks_or_bids.keys()[:count]
+        prices = np.array(keys, dtype)
+        quantities = np.fromiter(map(_quantity_of, map(asks_or_bids.__getitem__, keys)), dtype, count)
+        prices.flags.writeable = False
+        quantities.flags.writeable = False
+        self._depth_arrays[side, n] = (seq, prices, quantities)
+        return prices, quantities
+
+    def _visible_count(self, type_):
+        return self.asks_count if type_ == OrderType.ASK else self.bids_count
+
+    def _touch_level(self, type_, price):
+        """Register change of level quantity: invalidate market data cache if level with this price is (or was)
+        in visible window and emit LevelUpdate for subscribers
+
+        Note:
+            Should be called while level still exists in asks/bids (with quantity 0 before removing)
+        """
+        asks_or_bids = self._get_side(type_)
+        if asks_or_bids.bisect_left(price) < self._visible_count(type_):
+            self._market_tables[type_] = None
+            self._market_data = None
+        self._seq += 1
+        if self._subscribers:
+            self._pending_updates.append(LevelUpdate(self._seq, type_, price, asks_or_bids[price].quantity))
+
+    def _level_added(self, type_, price):
+        best = self._best[type_]
+        if best is None or (price < best if type_ == OrderType.ASK else price > best):
+            self._best[type_] = price
+
+    def _level_removed(self, type_, price):
+        if price != self._best[type_]:
+            return None
+        asks_or_bids = self._get_side(type_)
+        self._best[type_] = asks_or_bids.peekitem(0)[0] if asks_or_bids else None
+
+    def _get_market_table(self, type_):
+        cached = self._market_tables[type_]
+        count = self._visible_count(type_)
+        if cached is None or cached[0] != count:
+            cached = self._market_tables[type_] = (count, self.__to_market_table(self._get_side(type_), count))
+        return cached[1]
+
+    @property
+    def best_ask(self):
+        """Lowest ask price or None if asks are empty"""
+        return self._best[OrderType.ASK]
+
+    @property
+    def best_bid(self):
+        """Highest bid price or None if bids are empty"""
+        return self._best[OrderType.BID]
+
+    @property
+    def spread(self):
+        """Difference between best ask and best bid or None if one of sides is empty"""
+        best_ask, best_bid = self._best[OrderType.ASK], self._best[OrderType.BID]
+        if best_ask is None or best_bid is None:
+            return None
+        return best_ask - best_bid
+
+    @property
+    def mid(self):
+        """Middle price between best ask and best bid or None if one of sides is empty
+
+        Note:
+            Value is always exact Decimal, for use_ticks=True in ticks, with half of tick (like Decimal("2.5")) when
+            sum of best prices is odd
+        """
+        best_ask, best_bid = self._best[OrderType.ASK], self._best[OrderType.BID]
+        if best_ask is None or best_bid is None:
+            return None
+        total = best_ask + best_bid
+        if type(total) is int:
+            total = Decimal(total)
+        return total / 2
 
     def _check_order_exist_and_get_meta(self, order_id):
         if order_id in self.orders_meta:
@@ -149,7 +865,7 @@ class OrderBook:
     @property
     def market_data(self):
         """
-        Return sorted "asks" and "bids" in dict
+        Return sorted "asks" and "bids" in dict. Both sides start from best price (lowest ask, highest bid)
         :return: {
             "asks": [
                 {
@@ -158,46 +874,304 @@ class OrderBook:
             ...],
             "bids": [...]
         }
+
+        Note:
+            Snapshot is cached and shared between calls, it is rebuilt only when visible levels were changed.
+            Don't modify returned value.
         """
-        #  TODO: Maybe i should use event-base implementation with mutex for good speed and support clearly snapshot,
-        #   but it so long way for implementation.
-        #   (support mutex in orderList layer(adding\remove)+ global mutex for orderBook layer)
+        # thread-safe access: ConcurrentOrderBook, incremental changes: subscribe (LevelUpdate)
 
-        return {
-            "asks": self.__to_market_table(self.asks, self.asks_count),
-            "bids": self.__to_market_table(self.bids, self.bids_count),
-        }
+        asks = self._get_market_table(OrderType.ASK)
+        bids = self._get_market_table(OrderType.BID)
+        market_data = self._market_data
+        if market_data is None or market_data["asks"] is not asks or market_data["bids"] is not bids:
+            market_data = self._market_data = {"asks": asks, "bids": bids}
+        return market_data
 
-    def add_order(self, order: Order):
-        """
-        Add order with pre-validating. If this instance doesn't have bids or asks (one of and depends of order type)
-        then init new container for orders with same price for clearly manage total quantity and order processing
+    def encoded_market_data(self, encoding="json"):
+        """Return market_data encoded by MARKET_DATA_ENCODERS[encoding] ("json", "binary" or own encoder)
 
-        :param order:
-        :return:
+        Note:
+            Buffer is cached together with market_data snapshot, so it is encoded once per change of visible
+            levels and shared between calls. Returned read-only memoryview can be written to sockets without copies
+        :return: memoryview of bytes
         """
-        if not isinstance(order, Order) and order.trading_pair == self.trading_pair:
+        market_data = OrderBook.market_data.fget(self)
+        cached = self._encoded_market_data.get(encoding)
+        if cached is not None and cached[0] is market_data:
+            return cached[1]
+        if encoding not in MARKET_DATA_ENCODERS:
+            raise Exception(f"Not supported {encoding=}")
+        buffer = memoryview(MARKET_DATA_ENCODERS[encoding](self, market_data))
+        self._encoded_market_data[encoding] = (market_data, buffer)
+        return buffer
+
+    def _check_order(self, order: Order):
+        if not isinstance(order, Order):
             raise Exception("Try to add not Order instance")
         if order.id in self.orders_meta:
             raise Exception("Order exist in this OrderBook")
+        if order.client_id is not None and order.client_id in self.client_ids:
+            raise Exception("Order with same client_id exist in this OrderBook")
         if order.trading_pair != self.trading_pair:
             raise Exception(f"Try to add order with not supported trading pair. Supported {self.trading_pair=}")
+        if order.type not in (OrderType.ASK, OrderType.BID):
+            raise Exception(f"Not supported {order.type=}")
+        if not self.use_ticks and isinstance(order, TickOrder):
+            raise Exception("Tick orders supported only by OrderBook with use_ticks=True")
+
+    def _add_level_orders(self, type_, price, orders):
+        """Add already validated orders with same type and price, level is touched once"""
+        asks_or_bids = self._get_side(type_)
+        new_level = price not in asks_or_bids
+        order_list = asks_or_bids[price]
+        order_list.add_orders(orders)
+        orders_meta = self.orders_meta
+        for order in orders:
+            orders_meta[order.id] = order_list
+            if order.client_id is not None:
+                self.client_ids[order.client_id] = order.id
+            if order.expire_ts is not None:
+                self._schedule_expiry(order)
+        self._owner_orders_added(orders)
+        if self._journal is not None:
+            for order in orders:
+                self._journal.append(RecordType.ADD, *_order_to_values(order))
+        if new_level:
+            self._level_added(type_, price)
+        self._touch_level(type_, price)
+
+    def _schedule_expiry(self, order):
+        scheduled = self._expiry_scheduled
+        if scheduled.get(order.id) == order.expire_ts:
+            return  # already scheduled, e.g. order was amended
+        heap = self._expiry_heap
+        if len(heap) > 2 * len(self.orders_meta) + 1024:
+            # keep one entry per resting order, so heap size is bounded by count of resting orders
+            scheduled = self._expiry_scheduled = {
+                order_id: expire_ts for order_id, expire_ts in scheduled.items() if order_id in self.orders_meta
+            }
+            entries = {}
+            for entry in heap:
+                if scheduled.get(entry[2]) == entry[0]:
+                    entries.setdefault(entry[2], entry)
+            heap[:] = entries.values()
+            heapq.heapify(heap)
+        scheduled[order.id] = order.expire_ts
+        heapq.heappush(heap, (order.expire_ts, next(self._expiry_counter), order.id))
 
-        if order.type == OrderType.ASK:
-            self.asks[order.price].add_order(order)
-        elif order.type == OrderType.BID:
-            self.bids[order.price].add_order(order)
+    def _owner_orders_added(self, orders):
+        owner_orders = self.owner_orders
+        for order in orders:
+            order_ids = owner_orders.get(order.owner_id)
+            if order_ids is None:
+                order_ids = owner_orders[order.owner_id] = {}
+            order_ids[order.id] = None
+
+    def _owner_order_removed(self, order):
+        order_ids = self.owner_orders[order.owner_id]
+        del order_ids[order.id]
+        if not order_ids:
+            del self.owner_orders[order.owner_id]
+
+    def _remove_level_orders(self, order_list: OrderList, order_ids):
+        """Remove existing orders from one container and drop container if it becomes empty"""
+        for order_id in order_ids:
+            order = order_list.del_order(order_id)
+            del self.orders_meta[order_id]
+            if order.client_id is not None:
+                del self.client_ids[order.client_id]
+            self._owner_order_removed(order)
+            if self._journal is not None:
+                self._journal.append(RecordType.CANCEL, order_id)
+        type_, price = order_list.order_type_meta, order_list.price
+        self._touch_level(type_, price)
+        if order_list.quantity == 0:
+            del self._get_side(type_)[price]
+            self._level_removed(type_, price)
+
+    def add_order(self, order: Order):
+        """
+        Add order with pre-validating. If this instance doesn't have bids or asks (one of and depends of order type)
+        then init new container for orders with same price for clearly manage total quantity and order processing.
+        In matching mode order is matched with opposite side first (see _match_order)
+
+        :param order:
+        :return: list of Trade (always empty if matching is disabled)
+        """
+        self._check_order(order)
+        if self.matching:
+            trades = self._match_order(order)
         else:
-            raise Exception(f"Not supported {order.type=}")
-        self.orders_meta[order.id] = (order.price, order.type)
+            self._add_level_orders(order.type, self._order_list_cls.price_key(order), (order,))
+            trades = []
+        self._commit()
+        return trades
 
-    def __find_order_list_with_specific_order(self, order_id, remove_from_list) -> OrderList:
-        self._check_order_exist_and_get_meta(order_id)
-        if remove_from_list:
-            price, type_ = self.orders_meta.pop(order_id)
+    def _match_order(self, order: Order):
+        """Sweep levels of opposite side from best price while they cross order price
+
+        Note:
+            Complexity O(levels touched + orders filled). Partially filled resting order keeps time priority,
+            not filled rest of incoming order is stored with same id
+
+        :param order: validated order
+        :return: list of Trade
+        """
+        order_list_cls = self._order_list_cls
+        price = order_list_cls.price_key(order)
+        volume = order_list_cls.volume_key(order)
+        places = order_list_cls.volume_places(order)
+        is_bid = order.type == OrderType.BID
+        maker_type = OrderType.ASK if is_bid else OrderType.BID
+        makers = self._get_side(maker_type)
+        trades = []
+        while volume and makers:
+            level_price, order_list = makers.peekitem(0)
+            if (level_price > price) if is_bid else (level_price < price):
+                break
+            fills, volume = order_list.fill(volume, places)
+            for maker, filled_volume, is_closed in fills:
+                if is_closed:
+                    places = _max_places(places, order_list_cls.volume_places(maker))
+                    del self.orders_meta[maker.id]
+                    if maker.client_id is not None:
+                        del self.client_ids[maker.client_id]
+                    self._owner_order_removed(maker)
+                if self._journal is not None:
+                    self._journal.append(RecordType.FILL, maker.id, 0 if is_closed else maker.volume)
+                trades.append(Trade(
+                    self.trading_pair, level_price, filled_volume, maker.id, order.id, order.type,
+                    OrderStatus.CLOSE if is_closed else OrderStatus.TRADE,
+                ))
+            self._touch_level(maker_type, level_price)
+            if not order_list:
+                del makers[level_price]
+                self._level_removed(maker_type, level_price)
+
+        if volume and (order.expire_ts is None or order.expire_ts > order.ts):
+            if trades:
+                order = order_list_cls.order_with_volume(order, volume, places)
+            self._add_level_orders(order.type, price, (order,))
+        return trades
+
+    def add_orders(self, orders):
+        """
+        Add many orders at once. All orders are validated before changes (all-or-nothing), then grouped by
+        type and price, so each container and caches are touched once per level.
+        In matching mode orders are matched one by one in batch order (without grouping)
+
+        :param orders: iterable of Order
+        :raise OrderBookBatchError: with error message per invalid order index, orders are not added
+        :return: list of Trade (always empty if matching is disabled)
+        """
+        orders = list(orders)
+        errors = {}
+        batch_ids = set()
+        batch_client_ids = set()
+        for idx, order in enumerate(orders):
+            try:
+                self._check_order(order)
+                if order.id in batch_ids:
+                    raise Exception("Order exist in this batch")
+                if order.client_id is not None and order.client_id in batch_client_ids:
+                    raise Exception("Order with same client_id exist in this batch")
+            except Exception as e:
+                errors[idx] = str(e)
+                continue
+            batch_ids.add(order.id)
+            if order.client_id is not None:
+                batch_client_ids.add(order.client_id)
+        if errors:
+            raise OrderBookBatchError(errors)
+
+        trades = []
+        if self.matching:
+            for order in orders:
+                trades.extend(self._match_order(order))
         else:
-            price, type_ = self.orders_meta[order_id]
-        return self.asks[price] if type_ == OrderType.ASK else self.bids[price]
+            price_key = self._order_list_cls.price_key
+            levels = dict()
+            for order in orders:
+                levels.setdefault((order.type, price_key(order)), []).append(order)
+            with _gc_paused():
+                for (type_, price), level_orders in levels.items():
+                    self._add_level_orders(type_, price, level_orders)
+        self._commit()
+        return trades
+
+    def new_order(self, price, volume, type_, owner_id, client_id=None) -> Order:
+        """Create order of this OrderBook with id from id_generator (order is not added)
+
+        :param price: Decimal or int ticks (TickOrder is created for ticks)
+        :param volume: same type as price
+        :param client_id: optional external id, see order_id_by_client_id
+        :return: Order or TickOrder
+        """
+        order_cls = TickOrder if type(price) is int else Order
+        return order_cls(self.trading_pair, price, volume, type_, owner_id, self.id_generator(), client_id=client_id)
+
+    def orders_by_owner(self, owner_id):
+        """Return resting orders of owner in order of adding (batch is added by levels), O(orders of owner)
+
+        :return: [Order, ...] (with current volume for partially filled orders)
+        """
+        orders_meta = self.orders_meta
+        return [orders_meta[order_id].get_order(order_id) for order_id in self.owner_orders.get(owner_id, ())]
+
+    def cancel_all(self, owner_id, side=None):
+        """Remove all resting orders of owner (kill switch), O(orders of owner)
+
+        Note:
+            Orders are grouped by container, so each level is touched once and removed if it becomes empty
+
+        :param owner_id:
+        :param side: OrderType.ASK or OrderType.BID, None -> both sides
+        :return: list of removed order ids
+        """
+        if side is not None:
+            self._get_side(side)
+        levels = dict()  # id(OrderList) -> (OrderList, [order_id, ...])
+        order_ids = []
+        for order_id in list(self.owner_orders.get(owner_id, ())):
+            order_list = self.orders_meta[order_id]
+            if side is not None and order_list.order_type_meta != side:
+                continue
+            levels.setdefault(id(order_list), (order_list, []))[1].append(order_id)
+            order_ids.append(order_id)
+        for order_list, level_order_ids in levels.values():
+            self._remove_level_orders(order_list, level_order_ids)
+        self._commit()
+        return order_ids
+
+    def cancel_range(self, side, lo=None, hi=None):
+        """Remove all orders of side at levels with lo <= price <= hi (e.g. quotes outside of band), O(log n + k)
+
+        :param side: OrderType.ASK or OrderType.BID
+        :param lo: min price (ticks for use_ticks=True), None -> without bound
+        :param hi: max price, None -> without bound
+        :return: list of removed order ids
+        """
+        asks_or_bids = self._get_side(side)
+        order_ids = []
+        for price in list(self._irange(side, lo, hi)):
+            order_list = asks_or_bids[price]
+            level_order_ids = [order.id for order in order_list]
+            self._remove_level_orders(order_list, level_order_ids)
+            order_ids.extend(level_order_ids)
+        self._commit()
+        return order_ids
+
+    def order_id_by_client_id(self, client_id):
+        """Return id of resting order added with client_id"""
+        order_id = self.client_ids.get(client_id)
+        if order_id is None:
+            raise KeyError(f"Not exist {client_id=}")
+        return order_id
+
+    def __find_order_list_with_specific_order(self, order_id) -> OrderList:
+        self._check_order_exist_and_get_meta(order_id)
+        return self.orders_meta[order_id]
 
     def remove_order(self, order_id):
         """
@@ -206,22 +1180,290 @@ class OrderBook:
         :param order_id:
         :return:
         """
-        order_list = self.__find_order_list_with_specific_order(order_id, remove_from_list=True)
-        order_list.del_order(order_id)
-        if order_list.quantity == 0:
-            if order_list.order_type_meta == OrderType.ASK:
-                del self.asks[order_list.price]
-            else:
-                del self.bids[order_list.price]
+        order_list = self.__find_order_list_with_specific_order(order_id)
+        self._remove_level_orders(order_list, (order_id,))
+        self._commit()
+
+    def amend_order(self, order_id, new_volume=None, new_price=None):
+        """
+        Change volume and/or price of resting order (same id, client_id and owner).
+        Volume decrease at same price is applied in place in O(1) and keeps time priority,
+        volume increase or price change moves order to the end of queue of (new) level in one operation.
+        In matching mode order with new price is matched with opposite side first (see _match_order)
+
+        :param order_id:
+        :param new_volume: in units of order (Decimal or int ticks for TickOrder), None -> keep volume
+        :param new_price: in units of order, None -> keep price
+        :return: list of Trade (always empty if matching is disabled)
+        """
+        if new_volume is None and new_price is None:
+            raise Exception("Nothing to amend, set new_volume or new_price")
+        order_list = self.__find_order_list_with_specific_order(order_id)
+        order = order_list.get_order(order_id)
+        changes = {}
+        if new_price is not None and new_price != order.price:
+            changes["price"] = new_price
+        if new_volume is not None and new_volume != order.volume:
+            changes["volume"] = new_volume
+        if not changes:
+            return []
+
+        if "price" not in changes and new_volume < order.volume:
+            new_order = _replace_order(order, volume=new_volume)  # validates new volume before changes
+            volume = self._order_list_cls.volume_key(new_order)
+            order_list.reduce_order(order_id, volume, new_order)
+            if self._journal is not None:
+                self._journal.append(RecordType.AMEND, order_id, new_order.volume)
+            self._touch_level(order_list.order_type_meta, order_list.price)
+            self._commit()
+            return []
+
+        # new order is validated before changes, priority is lost -> new ts
+        new_order = _replace_order(order, ts=time.time_ns(), **changes)
+        self._remove_level_orders(order_list, (order_id,))
+        if self.matching:
+            trades = self._match_order(new_order)
+        else:
+            self._add_level_orders(new_order.type, self._order_list_cls.price_key(new_order), (new_order,))
+            trades = []
+        self._commit()
+        return trades
+
+    @property
+    def next_expire_ts(self):
+        """Earliest expire_ts of resting orders (can be of already removed order) or None, for timer of expire_orders"""
+        return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def expire_orders(self, now=None):
+        """Remove resting orders with expire_ts <= now
+
+        Note:
+            O(expired orders * log n) without scan of book. Removal is the same as remove_order (journal CANCEL record,
+            LevelUpdate, empty level is dropped), each level is touched once. Orders are matched until they are
+            expired by this call
+        :param now: time in ns, time.time_ns() by default
+        :return: list of expired Order
+        """
+        if now is None:
+            now = time.time_ns()
+        heap = self._expiry_heap
+        levels = {}
+        expired = []
+        while heap and heap[0][0] <= now:
+            expire_ts, _, order_id = heapq.heappop(heap)
+            # stale entry of order which was re-added with other expire_ts
+            if self._expiry_scheduled.get(order_id) != expire_ts:
+                continue
+            del self._expiry_scheduled[order_id]
+            order_list = self.orders_meta.get(order_id)
+            if order_list is None:
+                continue
+            order = order_list.get_order(order_id)
+            levels.setdefault(id(order_list), (order_list, {}))[1][order_id] = None
+            expired.append(order)
+        for order_list, order_ids in levels.values():
+            self._remove_level_orders(order_list, order_ids)
+        self._commit()
+        return expired
+
+    def remove_orders(self, order_ids):
+        """
+        Remove many orders at once. All ids are validated before changes (all-or-nothing), then grouped by
+        container, so each level is touched once and removed if it becomes empty
+
+        :param order_ids: iterable of order ids
+        :raise OrderBookBatchError: with error message per invalid id index, orders are not removed
+        :return:
+        """
+        order_ids = list(order_ids)
+        errors = {}
+        levels = dict()  # id(OrderList) -> (OrderList, [order_id, ...])
+        batch_ids = set()
+        for idx, order_id in enumerate(order_ids):
+            try:
+                order_list = self.__find_order_list_with_specific_order(order_id)
+                if order_id in batch_ids:
+                    raise Exception("Order exist in this batch")
+            except Exception as e:
+                errors[idx] = str(e)
+                continue
+            batch_ids.add(order_id)
+            levels.setdefault(id(order_list), (order_list, []))[1].append(order_id)
+        if errors:
+            raise OrderBookBatchError(errors)
+
+        with _gc_paused():
+            for order_list, level_order_ids in levels.values():
+                self._remove_level_orders(order_list, level_order_ids)
+        self._commit()
 
     def get_order_by(self, order_id) -> Order:
         """Get order from orderBook instance
 
-        :param order_id: str(uuid4) like "a8e081bc-a086-4316-bedc-e406d72eb752"
+        :param order_id: Order.id, by default 16 bytes of uuid4 (uuid.uuid4().bytes)
+        :return:
+        """
+        order_list = self.__find_order_list_with_specific_order(order_id)
+        return order_list.get_order(order_id)
+
+    def _commit(self):
+        """Finish public operation which changed orderBook: write journal and send level updates"""
+        if self._journal is not None:
+            self._journal.commit()
+        if self._pending_updates:
+            updates, self._pending_updates = self._pending_updates, []
+            for callback in self._subscribers:
+                callback(updates)
+
+    def subscribe(self, callback):
+        """Subscribe to level updates (L2 deltas)
+
+        Note:
+            callback is called after each operation which changed levels with list of LevelUpdate
+            (sorted by seq). Use snapshot() for initial state and apply updates with seq > snapshot seq.
+            Callback shouldn't change orderBook
+        :param callback: callable(list[LevelUpdate])
         :return:
         """
-        order_list = self.__find_order_list_with_specific_order(order_id, remove_from_list=False)
-        return [i for i in order_list if order_id == i][0]
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    @property
+    def seq(self):
+        """Seq of last level update"""
+        return self._seq
+
+    def snapshot(self, depth=None):
+        """Return all levels (or top depth levels) with seq of last level update included in them
+
+        :param depth: max count of levels for each side, None -> all levels
+        :return: (seq, {"asks": [(price, quantity), ...], "bids": [...]})
+        """
+        return self._seq, {
+            "asks": self.depth(OrderType.ASK, depth),
+            "bids": self.depth(OrderType.BID, depth),
+        }
+
+    def stats(self):
+        """Return counts of levels and orders per side and stats of operations (for instrument=True only)
+
+        :return: {
+            "trading_pair": <value>,
+            "asks": {"levels": <value>, "orders": <value>, "max_level_orders": <size of largest OrderList>},
+            "bids": {...},
+            "max_level_orders": <value>,
+            "operations": {<operation>: {"count", "errors", "mean_ns", "p50_ns", "p90_ns", "p99_ns", "p999_ns",
+                                         "max_ns"}},
+        }
+
+        Note:
+            Counts are computed on call, O(levels). Containers are copied before reading, so stats can be read
+            from other thread (e.g. metrics.start_metrics_server)
+        """
+        result = {"trading_pair": self.trading_pair}
+        for name, asks_or_bids in (("asks", self.asks), ("bids", self.bids)):
+            sizes = [len(order_list) for order_list in list(dict.values(asks_or_bids))]
+            result[name] = {"levels": len(sizes), "orders": sum(sizes), "max_level_orders": max(sizes, default=0)}
+        result["max_level_orders"] = max(result["asks"]["max_level_orders"], result["bids"]["max_level_orders"])
+        result["operations"] = self._metrics.operations_stats() if self._metrics is not None else {}
+        return result
+
+    def _journal_config(self):
+        return [self.trading_pair, self.asks_count, self.bids_count, int(self.use_ticks), int(self.matching)]
+
+    def _snapshot_records(self):
+        # orders_meta keeps order of adding (same as order of every level queue), so restored owner_orders and
+        # time priority are the same
+        for order_id, order_list in self.orders_meta.items():
+            yield RecordType.ADD, _order_to_values(order_list.get_order(order_id))
+        for type_, asks_or_bids in ((OrderType.ASK, self.asks), (OrderType.BID, self.bids)):
+            for price, order_list in asks_or_bids.items():
+                yield RecordType.LEVEL, (type_, price, *order_list.format_state())
+
+    def write_snapshot(self):
+        """Write full snapshot of orders (with time priority) to journal directory
+
+        Note:
+            Journal segments before snapshot are removed, so OrderBook.restore replays only records after it
+        :return: seq of snapshot
+        """
+        if self._journal is None:
+            raise Exception("OrderBook was created without journal_path")
+        return self._journal.write_snapshot(self._journal_config(), self._snapshot_records())
+
+    def _apply_record(self, record_type, values):
+        """Apply journal record without matching and journaling (used for restore)"""
+        if record_type == RecordType.ADD:
+            order = _order_from_values(values)
+            self._add_level_orders(order.type, self._order_list_cls.price_key(order), (order,))
+        elif record_type == RecordType.CANCEL:
+            order_id, = values
+            self._remove_level_orders(self.orders_meta[order_id], (order_id,))
+        elif record_type in (RecordType.FILL, RecordType.AMEND):
+            order_id, rest_volume = values
+            order_list = self.orders_meta[order_id]
+            if rest_volume:
+                order = _replace_order(order_list.get_order(order_id), volume=rest_volume)
+                order_list.reduce_order(order_id, self._order_list_cls.volume_key(order), order)
+                self._touch_level(order_list.order_type_meta, order_list.price)
+            else:
+                self._remove_level_orders(order_list, (order_id,))
+        elif record_type == RecordType.LEVEL:
+            type_, price, *format_state = values
+            self._get_side(type_)[price].set_format_state(*format_state)
+            self._market_tables[type_] = None
+            self._market_data = None
+        elif record_type != RecordType.CONFIG:
+            raise Exception(f"Not supported journal {record_type=}")
+
+    @classmethod
+    def restore(cls, journal_path, instrument=False, id_generator=None):
+        """Load OrderBook from latest snapshot and replay journal records after it
+
+        Note:
+            Restored orderBook continues writing to same journal (in new segment)
+
+        :param journal_path: directory with journal of OrderBook
+        :param instrument: same as for OrderBook, replay is not recorded
+        :param id_generator: same as for OrderBook, should not repeat ids of restored orders
+            (e.g. SequentialIds(start=max restored id + 1))
+        :return: OrderBook
+        """
+        journal = Journal(journal_path)
+        snapshot = journal.read_snapshot()
+        if snapshot is not None:
+            from_seq, config, records = snapshot
+        else:
+            from_seq, records = 0, []
+            config = next((values for type_, _, values in journal.read_records() if type_ == RecordType.CONFIG), None)
+            if config is None:
+                raise Exception(f"Journal is empty {journal_path=}")
+
+        trading_pair, asks_count, bids_count, use_ticks, matching = config
+        order_book = cls(trading_pair, asks_count, bids_count, use_ticks=bool(use_ticks), matching=bool(matching),
+                         instrument=instrument, id_generator=id_generator)
+        with _gc_paused():
+            for record_type, values in records:
+                order_book._apply_record(record_type, values)
+            for record_type, _, values in journal.read_records(from_seq):
+                order_book._apply_record(record_type, values)
+
+        journal.open_segment(order_book._journal_config())
+        order_book._journal = journal
+        return order_book
+
+    def close(self):
+        """
+        Flush and close journal
+
+        Note:
+            OrderBook stays usable in memory, changes after close are not journaled
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+from decimal import Decimal
+from random import Random
+
+import pytest
+
+from order_book import OrderBook, OrderType, TickOrder, TICKS_PER_UNIT
+from test_order_book import DEFAULT_TRADING_PAIR, generate_order_obj, params_by_order_type
+
+np = pytest.importorskip("numpy")
+analytics = pytest.importorskip("analytics")
+
+
+def fill_order_book(order_book, count=300, seed=0):
+    rnd = Random(seed)
+    for _ in range(count):
+        order_type = rnd.choice([OrderType.ASK, OrderType.BID])
+        price = rnd.randint(101, 150) if order_type == OrderType.ASK else rnd.randint(50, 100)
+        volume = rnd.randint(1, 10 ** 8)
+        if order_book.use_ticks:
+            order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, price * TICKS_PER_UNIT, volume, order_type, "o"))
+        else:
+            order_book.add_order(generate_order_obj(
+                price=Decimal(price), volume=Decimal(volume).scaleb(-8), type=order_type
+            ))
+
+
+class TestDepthArrays:
+
+    @params_by_order_type()
+    @pytest.mark.parametrize("use_ticks", [False, True])
+    def test_positive_same_levels_as_depth(self, order_type, use_ticks):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=use_ticks)
+        fill_order_book(order_book)
+        for n in (None, 0, 1, 10, 1000):
+            prices, quantities = order_book.depth_arrays(order_type, n)
+            assert prices.dtype == quantities.dtype == (np.int64 if use_ticks else np.float64)
+            expected = order_book.depth(order_type, n)
+            assert prices.tolist() == [price for price, _ in expected]
+            assert quantities.tolist() == [float(quantity) if not use_ticks else quantity for _, quantity in expected]
+
+    def test_positive_cached_until_levels_change(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR)
+        fill_order_book(order_book, 20)
+        prices, quantities = order_book.depth_arrays(OrderType.ASK, 5)
+        assert order_book.depth_arrays(OrderType.ASK, 5)[0] is prices
+        with pytest.raises(ValueError):
+            quantities[0] = 1
+        ord = generate_order_obj(price=Decimal(prices[0]), type=OrderType.ASK)
+        order_book.add_order(ord)
+        new_prices, new_quantities = order_book.depth_arrays(OrderType.ASK, 5)
+        assert new_prices is not prices
+        assert new_quantities[0] == float(order_book.depth(OrderType.ASK, 1)[0][1])
+        assert new_quantities[0] > quantities[0]
+
+    def test_positive_empty_side(self):
+        prices, quantities = OrderBook(DEFAULT_TRADING_PAIR).depth_arrays(OrderType.BID)
+        assert len(prices) == len(quantities) == 0
+
+
+class TestAnalytics:
+
+    def setup(self):
+        self.prices = np.array([100, 101, 103], dtype=np.int64)
+        self.quantities = np.array([2, 3, 5], dtype=np.int64)
+
+    def test_positive_cumulative_depth(self):
+        assert analytics.cumulative_depth(self.quantities).tolist() == [2, 5, 10]
+        assert analytics.cumulative_notional(self.prices, self.quantities).tolist() == [200, 503, 1018]
+
+    def test_positive_vwap_to_fill(self):
+        assert analytics.vwap_to_fill(self.prices, self.quantities, 1) == 100
+        assert analytics.vwap_to_fill(self.prices, self.quantities, 2) == 100
+        assert analytics.vwap_to_fill(self.prices, self.quantities, 4) == (200 + 202) / 4
+        result = analytics.vwap_to_fill(self.prices, self.quantities, [5, 10, 10.5])
+        assert result[:2].tolist() == [503 / 5, 1018 / 10]
+        assert np.isnan(result[2])
+        assert np.isnan(analytics.vwap_to_fill(self.prices[:0], self.quantities[:0], 1))
+
+    def test_positive_vwap_matches_decimal_walk(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR)
+        fill_order_book(order_book)
+        prices, quantities = order_book.depth_arrays(OrderType.ASK)
+        for size in (Decimal("0.5"), Decimal("3"), Decimal("20")):
+            rest, notional = size, Decimal(0)
+            for price, quantity in order_book.depth(OrderType.ASK, None):
+                volume = min(rest, quantity)
+                notional += price * volume
+                rest -= volume
+            assert analytics.vwap_to_fill(prices, quantities, float(size)) == pytest.approx(float(notional / size))
+
+    def test_positive_imbalance(self):
+        bids = np.array([3, 1], dtype=np.int64)
+        asks = np.array([1, 1, 4], dtype=np.int64)
+        assert analytics.imbalance(bids, asks, 1) == 0.5
+        assert analytics.imbalance(bids, asks) == (4 - 6) / 10
+        assert analytics.imbalance_by_depth(bids, asks).tolist() == [0.5, 2 / 6]
+        assert np.isnan(analytics.imbalance(bids[:0], asks[:0]))
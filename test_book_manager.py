@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+import pytest
+
+from book_manager import BookManager
+from order_book import OrderBook, OrderType
+from test_order_book import generate_order_obj
+
+TRADING_PAIRS = ["BTC_USD", "ETH_USD", "LTC_USD", "XRP_USD"]
+
+
+class TestBookManager:
+
+    def setup(self):
+        self.manager = BookManager(TRADING_PAIRS, workers=2, batch_size=7)
+
+    def teardown(self):
+        self.manager.close()
+
+    def test_positive_orders_routed_by_trading_pair(self):
+        expected = {pair: OrderBook(pair) for pair in TRADING_PAIRS}
+        orders = [
+            generate_order_obj(trading_pair=TRADING_PAIRS[i % len(TRADING_PAIRS)], price=Decimal(i % 5 + 1),
+                               type=OrderType.ASK if i % 2 else OrderType.BID)
+            for i in range(40)
+        ]
+        results = self.manager.add_orders(orders)
+        assert results == [(True, [])] * len(orders)
+        for ord in orders:
+            expected[ord.trading_pair].add_order(ord)
+        for ord in orders[::3]:
+            self.manager.remove_order(ord.trading_pair, ord.id)
+            expected[ord.trading_pair].remove_order(ord.id)
+        assert self.manager.market_data() == {pair: book.market_data for pair, book in expected.items()}
+        assert self.manager.market_data("ETH_USD") == expected["ETH_USD"].market_data
+        assert self.manager.get_order_by(orders[1].trading_pair, orders[1].id) == orders[1]
+
+    def test_positive_submitted_commands_results_in_submit_order(self):
+        ords = [generate_order_obj(trading_pair=pair) for pair in TRADING_PAIRS * 3]
+        for ord in ords:
+            self.manager.submit_order(ord)
+        self.manager.submit_order(ords[0])
+        self.manager.submit_remove(ords[1].trading_pair, ords[1].id)
+        results = self.manager.flush()
+        assert results[:len(ords)] == [(True, [])] * len(ords)
+        assert results[len(ords)] == (False, "Order exist in this OrderBook")
+        assert results[len(ords) + 1] == (True, None)
+        assert self.manager.flush() == []
+
+    def test_positive_submitted_results_kept_after_synchronous_calls(self):
+        ords = [generate_order_obj(trading_pair=pair) for pair in TRADING_PAIRS * 2]
+        self.manager.submit_order(ords[0])
+        self.manager.submit_order(ords[0])
+        self.manager.submit_remove("BTC_USD", b"nope")
+        assert self.manager.market_data("BTC_USD") is not None
+        assert self.manager.add_orders(ords[1:]) == [(True, [])] * (len(ords) - 1)
+        self.manager.submit_remove(ords[1].trading_pair, ords[1].id)
+        assert self.manager.get_order_by(ords[2].trading_pair, ords[2].id) == ords[2]
+        self.manager.market_data()
+        results = self.manager.flush()
+        assert results[0] == (True, [])
+        assert results[1] == (False, "Order exist in this OrderBook")
+        assert not results[2][0] and "Not exist" in results[2][1]
+        assert results[3] == (True, None)
+        assert len(results) == 4
+
+    def test_negative_errors_raised_from_workers(self):
+        ord = generate_order_obj(trading_pair="BTC_USD")
+        with pytest.raises(Exception, match="Not exist"):
+            self.manager.remove_order("BTC_USD", ord.id)
+        with pytest.raises(Exception, match="Not supported"):
+            self.manager.add_order(generate_order_obj(trading_pair="DOGE_USD"))
+        self.manager.add_order(ord)
+        with pytest.raises(Exception, match="Order exist"):
+            self.manager.add_order(ord)
@@ -0,0 +1,142 @@
+import threading
+from decimal import Decimal
+from random import Random
+
+from concurrent_order_book import ConcurrentOrderBook
+from order_book import Order, OrderType
+from test_order_book import DEFAULT_TRADING_PAIR, generate_order_obj
+
+
+def run_threads(target, count):
+    errors = []
+
+    def wrapper(idx):
+        try:
+            target(idx)
+        except Exception as e:  # pragma: no cover - reported by assert below
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapper, args=(idx,)) for idx in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+class TestConcurrentOrderBook:
+
+    def test_positive_parallel_add_and_remove_keep_consistent_state(self):
+        order_book = ConcurrentOrderBook(DEFAULT_TRADING_PAIR)
+        kept = [[] for _ in range(8)]
+
+        def writer(idx):
+            rnd = Random(idx)
+            for i in range(300):
+                order_type = OrderType.ASK if idx % 2 else OrderType.BID
+                ord = generate_order_obj(price=Decimal(rnd.randint(1, 20)), type=order_type)
+                order_book.add_order(ord)
+                if i % 3:
+                    order_book.remove_order(ord.id)
+                else:
+                    kept[idx].append(ord)
+                order_book.market_data
+
+        run_threads(writer, 8)
+        orders = [ord for orders in kept for ord in orders]
+        assert set(order_book.orders_meta) == {ord.id for ord in orders}
+        for asks_or_bids in (order_book.asks, order_book.bids):
+            for price, order_list in asks_or_bids.items():
+                assert order_list.quantity == sum(i.volume for i in orders if i.price == price and i.type ==
+                                                  order_list.order_type_meta)
+        for ord in orders:
+            assert order_book.get_order_by(ord.id) is ord
+
+    def test_positive_snapshot_never_shows_crossed_book_in_matching_mode(self):
+        order_book = ConcurrentOrderBook(DEFAULT_TRADING_PAIR, matching=True)
+        done = threading.Event()
+        snapshots = []
+
+        def reader():
+            while not done.is_set():
+                snapshots.append(order_book.market_data)
+
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+
+        def writer(idx):
+            rnd = Random(idx)
+            for _ in range(300):
+                order_book.add_order(generate_order_obj(
+                    price=Decimal(rnd.randint(95, 105)), volume=Decimal(rnd.randint(1, 5)),
+                    type=rnd.choice([OrderType.ASK, OrderType.BID]),
+                ))
+
+        run_threads(writer, 4)
+        done.set()
+        reader_thread.join()
+        assert snapshots
+        for snapshot in snapshots:
+            if snapshot["asks"] and snapshot["bids"]:
+                assert Decimal(snapshot["asks"][0]["price"]) > Decimal(snapshot["bids"][0]["price"])
+
+    def test_positive_same_id_added_once_from_parallel_threads(self):
+        order_book = ConcurrentOrderBook(DEFAULT_TRADING_PAIR)
+        results = []
+
+        def writer(idx):
+            type_ = OrderType.ASK if idx % 2 else OrderType.BID
+            for i in range(200):
+                try:
+                    order_book.add_order(Order(DEFAULT_TRADING_PAIR, Decimal("1"), Decimal("1"), type_, "o", id=i))
+                    results.append(i)
+                except Exception as e:
+                    assert "Order exist" in str(e)
+
+        run_threads(writer, 4)
+        assert sorted(results) == list(range(200))
+        assert len(order_book.asks.get(Decimal("1"), [])) + len(order_book.bids.get(Decimal("1"), [])) == 200
+
+    def test_positive_owner_index_consistent_after_parallel_adds_and_cancel_all(self):
+        order_book = ConcurrentOrderBook(DEFAULT_TRADING_PAIR)
+
+        def writer(idx):
+            rnd = Random(idx)
+            type_ = OrderType.ASK if idx % 2 else OrderType.BID
+            for i in range(200):
+                ord = generate_order_obj(price=Decimal(rnd.randint(1, 10)), type=type_, owner_id=f"owner-{i % 3}")
+                order_book.add_order(ord)
+                if i % 4 == 0:
+                    order_book.remove_order(ord.id)
+                if i % 50 == 0:
+                    order_book.orders_by_owner("owner-1")
+
+        run_threads(writer, 4)
+        for owner_id, order_ids in order_book.owner_orders.items():
+            assert {order_book.get_order_by(order_id).owner_id for order_id in order_ids} == {owner_id}
+        assert sum(len(order_ids) for order_ids in order_book.owner_orders.values()) == len(order_book.orders_meta)
+        order_book.cancel_all("owner-0")
+        order_book.cancel_all("owner-1", OrderType.ASK)
+        assert set(order_book.owner_orders) == {"owner-1", "owner-2"}
+        assert {ord.type for ord in order_book.orders_by_owner("owner-1")} == {OrderType.BID}
+
+    def test_positive_expire_orders_while_adding_from_parallel_threads(self):
+        order_book = ConcurrentOrderBook(DEFAULT_TRADING_PAIR)
+        expired = []
+
+        def worker(idx):
+            rnd = Random(idx)
+            type_ = OrderType.ASK if idx % 2 else OrderType.BID
+            for i in range(300):
+                order_book.add_order(generate_order_obj(price=Decimal(rnd.randint(1, 10)), type=type_,
+                                                        expire_ts=rnd.randint(0, 2)))
+                if idx == 0 and i % 20 == 0:
+                    expired.extend(order_book.expire_orders(now=0))
+
+        run_threads(worker, 4)
+        expired.extend(order_book.expire_orders(now=1))
+        assert all(ord.expire_ts <= 1 for ord in expired)
+        assert {order_book.get_order_by(order_id).expire_ts for order_id in order_book.orders_meta} == {2}
+        assert len(expired) + len(order_book.orders_meta) == 1200
+        assert sum(order_list.quantity for order_list in order_book.asks.values()) == \
+            sum(ord.volume for order_list in order_book.asks.values() for ord in order_list)
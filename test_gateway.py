@@ -0,0 +1,154 @@
+import asyncio
+import socket
+from decimal import Decimal
+
+import pytest
+
+from gateway import GatewayClient, Op, OrderGateway, Status, _frame, _read_frame
+from order_book import OrderBook, OrderType
+from test_order_book import DEFAULT_TRADING_PAIR, generate_order_obj
+
+
+def run_with_gateway(test, **order_book_kwargs):
+    async def runner():
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, **order_book_kwargs)
+        gateway = await OrderGateway(order_book, max_queue=4, batch_size=3, max_inflight=2).start()
+        client = await GatewayClient.connect(*gateway.address)
+        try:
+            await test(client, order_book)
+        finally:
+            await client.close()
+            await gateway.close()
+
+    asyncio.run(runner())
+
+
+def run_with_raw_connection(test, max_frame_size=1024):
+    async def runner():
+        gateway = await OrderGateway(OrderBook(DEFAULT_TRADING_PAIR), max_frame_size=max_frame_size).start()
+        reader, writer = await asyncio.open_connection(*gateway.address)
+        client = await GatewayClient.connect(*gateway.address)
+        try:
+            await test(reader, writer, client)
+        finally:
+            writer.close()
+            await client.close()
+            await gateway.close()
+
+    asyncio.run(runner())
+
+
+class TestOrderGateway:
+
+    def test_positive_add_get_cancel_and_market_data(self):
+        async def test(client, order_book):
+            order_id, trades = await client.add_order(Decimal("2"), Decimal("1.5"), OrderType.ASK, "owner")
+            assert trades == []
+            await client.add_order(Decimal("1"), Decimal("3"), OrderType.BID, "owner", b"bid")
+            assert await client.get_order(b"bid") == (Decimal("1"), Decimal("3"), OrderType.BID, "owner", b"bid",
+                                                      order_book.get_order_by(b"bid").ts)
+            seq, market_data = await client.market_data()
+            assert seq == order_book.seq
+            assert market_data == order_book.market_data
+            await client.cancel_order(order_id)
+            assert (await client.market_data())[1] == {"asks": [], "bids": [{"price": "1", "quantity": "3"}]}
+
+        run_with_gateway(test)
+
+    def test_positive_pipelined_requests_answered_in_queue_order(self):
+        async def test(client, order_book):
+            results = await asyncio.gather(*(
+                client.add_order(Decimal(i % 5 + 1), Decimal("1"), OrderType.ASK, "owner", i) for i in range(50)
+            ))
+            assert [order_id for order_id, _ in results] == list(range(50))
+            assert len(order_book.orders_meta) == 50
+
+        run_with_gateway(test)
+
+    def test_positive_trades_returned_in_matching_mode(self):
+        async def test(client, order_book):
+            await client.add_order(Decimal("2"), Decimal("1"), OrderType.ASK, "maker", b"maker")
+            _, trades = await client.add_order(Decimal("3"), Decimal("4"), OrderType.BID, "taker", b"taker")
+            assert trades == [(Decimal("2"), Decimal("1"), b"maker", "close")]
+
+        run_with_gateway(test, matching=True)
+
+    def test_negative_errors_returned_to_client(self):
+        async def test(client, order_book):
+            with pytest.raises(Exception, match="Not exist"):
+                await client.cancel_order(b"unknown")
+            with pytest.raises(Exception, match="Price and Volume should be int ticks"):
+                await client.add_order(Decimal("1"), Decimal("1"), OrderType.ASK, "owner")
+            order_id, _ = await client.add_order(10 ** 8, 10 ** 8, OrderType.ASK, "owner")
+            assert order_book.get_order_by(order_id).price == 10 ** 8
+
+        run_with_gateway(test, use_ticks=True)
+
+    def test_positive_cancelled_request_does_not_break_client(self):
+        async def test(client, order_book):
+            task = asyncio.create_task(client.add_order(Decimal("1"), Decimal("1"), OrderType.ASK, "owner", b"a"))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.get_order(b"a"), timeout=0)
+            assert (await asyncio.wait_for(client.market_data(), 5))[1] == order_book.market_data
+            assert (await asyncio.wait_for(client.get_order(b"a"), 5))[4] == b"a"
+
+        run_with_gateway(test)
+
+    def test_positive_not_reading_client_is_paused_without_blocking_others(self):
+        async def test(client, order_book):
+            order_book.add_order(generate_order_obj(id=b"big", owner_id="o" * 2 ** 16))
+            sock = socket.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, client._writer.get_extra_info("peername"))
+            reader, writer = await asyncio.open_connection(sock=sock)
+            # responses of ~64KB are not read, so server stops reading this connection when its buffers are full
+            for request_id in range(1000):
+                writer.write(_frame([request_id, Op.GET, b"big"]))
+            writer.write(_frame([1000, Op.ADD, Decimal("1"), Decimal("1"), OrderType.ASK, "slow", b"slow"]))
+            await asyncio.sleep(0.5)
+
+            await client.add_order(Decimal("1"), Decimal("1"), OrderType.ASK, "fast", b"fast")
+            assert b"fast" in order_book.orders_meta and b"slow" not in order_book.orders_meta
+            for request_id in range(1001):
+                assert (await _read_frame(reader))[:2] == [request_id, Status.OK]
+            assert b"slow" in order_book.orders_meta
+            writer.close()
+
+        run_with_gateway(test)
+
+    def test_negative_malformed_request_answered_with_error(self):
+        async def test(reader, writer, client):
+            for payload in (b"", b"\xff", b"\x01"):
+                writer.write(len(payload).to_bytes(4, "little") + payload)
+                request_id, status, message = await _read_frame(reader)
+                assert (request_id, status) == (None, Status.ERROR)
+                assert message.startswith("Invalid request")
+            writer.write(_frame([7, 4]))
+            assert (await _read_frame(reader))[:2] == [7, Status.OK]
+
+        run_with_raw_connection(test)
+
+    def test_negative_too_large_frame_closes_connection(self):
+        async def test(reader, writer, client):
+            writer.write((2 ** 32 - 1).to_bytes(4, "little"))
+            request_id, status, message = await _read_frame(reader)
+            assert (request_id, status) == (None, Status.ERROR) and "too large" in message
+            assert await reader.read() == b""
+            # other connections are served
+            assert (await client.market_data())[1] == {"asks": [], "bids": []}
+
+        run_with_raw_connection(test)
+
+    def test_negative_request_fails_after_connection_closed(self):
+        async def test(reader, writer, client):
+            client._writer.close()
+            await client._reader_task
+            with pytest.raises(ConnectionError):
+                await client.market_data()
+
+        run_with_raw_connection(test)
@@ -0,0 +1,195 @@
+import os
+from decimal import Decimal
+
+import pytest
+
+from journal import Journal, RecordType, encode_values, decode_values
+from order_book import OrderBook, OrderType, SequentialIds, TickOrder
+from test_order_book import DEFAULT_TRADING_PAIR, generate_order_obj, params_by_order_type
+
+
+def orders_state(order_book):
+    return {
+        side: [(price, [(i.id, i.volume, i.ts) for i in order_list]) for price, order_list in asks_or_bids.items()]
+        for side, asks_or_bids in (("asks", order_book.asks), ("bids", order_book.bids))
+    }
+
+
+class TestCodec:
+
+    def test_positive_encode_decode_values(self):
+        values = [None, 0, -1, 2 ** 63 - 1, 2 ** 100, -2 ** 70, "", "BTC_USD", b"\x00\xff", Decimal("1E+1"),
+                  Decimal("0.10000000")]
+        decoded = decode_values(encode_values(values))
+        assert decoded == values
+        assert [str(i) for i in decoded[-2:]] == ["1E+1", "0.10000000"]
+
+    def test_negative_encode_not_supported_type(self):
+        with pytest.raises(Exception) as e:
+            encode_values([1.5])
+        assert "Not supported type" in str(e.value)
+
+
+class TestJournalRestore:
+
+    @pytest.fixture(autouse=True)
+    def journal_path(self, tmp_path):
+        self.journal_path = str(tmp_path / "journal")
+
+    def fill_order_book(self, order_book, count=30):
+        orders = [generate_order_obj() for _ in range(count)]
+        order_book.add_orders(orders[:count // 2])
+        for ord in orders[count // 2:]:
+            order_book.add_order(ord)
+        order_book.remove_orders([ord.id for ord in orders[:5]])
+        order_book.remove_order(orders[-1].id)
+        return orders
+
+    def test_positive_restore_from_journal_without_snapshot(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, 3, 4, journal_path=self.journal_path)
+        self.fill_order_book(order_book)
+        order_book.close()
+        restored = OrderBook.restore(self.journal_path)
+        assert (restored.asks_count, restored.bids_count) == (3, 4)
+        assert orders_state(restored) == orders_state(order_book)
+        assert restored.market_data == order_book.market_data
+
+    def test_positive_restore_from_snapshot_and_journal_tail(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path)
+        orders = self.fill_order_book(order_book)
+        order_book.write_snapshot()
+        assert len([i for i in os.listdir(self.journal_path) if i.startswith("journal-")]) == 1
+        order_book.remove_order(orders[10].id)
+        self.fill_order_book(order_book, 10)
+        order_book.close()
+
+        restored = OrderBook.restore(self.journal_path)
+        assert orders_state(restored) == orders_state(order_book)
+        assert restored.market_data == order_book.market_data
+
+        restored.add_order(generate_order_obj())
+        restored.close()
+        assert orders_state(OrderBook.restore(self.journal_path)) == orders_state(restored)
+
+    def test_positive_changes_after_close_are_not_journaled(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path)
+        orders = self.fill_order_book(order_book)
+        order_book.close()
+        expected = orders_state(order_book)
+        order_book.add_order(generate_order_obj())
+        order_book.remove_order(orders[10].id)
+        order_book.close()
+        assert orders_state(OrderBook.restore(self.journal_path)) == expected
+
+    @pytest.mark.parametrize("use_ticks", [False, True], ids=["decimal", "ticks"])
+    def test_positive_restore_amended_orders(self, use_ticks):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=use_ticks, journal_path=self.journal_path)
+        orders = self.fill_order_book(order_book)
+        resting = [ord for ord in orders if ord.id in order_book.orders_meta]
+        order_book.amend_order(resting[0].id, new_volume=(resting[0].volume / 2).quantize(Decimal("1.00000000")))
+        order_book.amend_order(resting[1].id, new_price=Decimal("0.5"))
+        order_book.amend_order(resting[2].id, new_volume=resting[2].volume + 1)
+        order_book.close()
+        restored = OrderBook.restore(self.journal_path)
+        assert orders_state(restored) == orders_state(order_book)
+        assert restored.market_data == order_book.market_data
+
+    def test_positive_restore_expiry_schedule(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path)
+        orders = [generate_order_obj(price=Decimal("1"), type=OrderType.ASK, expire_ts=100 + i) for i in range(4)]
+        order_book.add_orders(orders)
+        order_book.write_snapshot()
+        order_book.expire_orders(now=100)
+        order_book.add_order(generate_order_obj(price=Decimal("2"), type=OrderType.ASK, expire_ts=101))
+        order_book.close()
+        restored = OrderBook.restore(self.journal_path)
+        assert orders_state(restored) == orders_state(order_book)
+        assert {ord.id for ord in restored.expire_orders(now=102)} == {ord.id for ord in orders[1:3]} | {
+            ord.id for ord in order_book.asks[Decimal("2")]}
+        assert list(restored.orders_meta) == [orders[3].id]
+
+    @pytest.mark.parametrize("use_ticks", [False, True], ids=["decimal", "ticks"])
+    @pytest.mark.parametrize("with_snapshot", [False, True], ids=["journal", "snapshot"])
+    def test_positive_restored_market_data_and_owner_orders_are_same(self, use_ticks, with_snapshot):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=use_ticks, matching=True,
+                               journal_path=self.journal_path)
+        first = generate_order_obj(price=Decimal("5.0"), volume=Decimal("1.50"), type=OrderType.ASK, owner_id="a")
+        orders = [
+            first,
+            generate_order_obj(price=Decimal("5"), volume=Decimal("2"), type=OrderType.ASK, owner_id="a"),
+            generate_order_obj(price=Decimal("4"), volume=Decimal("1"), type=OrderType.ASK, owner_id="a"),
+            generate_order_obj(price=Decimal("1"), volume=Decimal("2"), type=OrderType.BID, owner_id="a"),
+            generate_order_obj(price=Decimal("1"), volume=Decimal("0.00000010"), type=OrderType.ASK, owner_id="b"),
+        ]
+        for ord in orders:
+            order_book.add_order(ord)
+        order_book.remove_order(first.id)
+        order_book.amend_order(orders[1].id, new_volume=Decimal("1.50"))
+        if with_snapshot:
+            order_book.write_snapshot()
+        order_book.close()
+
+        restored = OrderBook.restore(self.journal_path)
+        assert order_book.market_data == {
+            "asks": [{"price": "4", "quantity": "1"}, {"price": "5.0", "quantity": "1.50"}],
+            "bids": [{"price": "1", "quantity": "1.99999990"}],
+        }
+        assert restored.market_data == order_book.market_data
+        assert [ord.id for ord in restored.orders_by_owner("a")] == [ord.id for ord in orders[1:4]]
+        assert [str(ord.volume) for ord in restored.orders_by_owner("a")] == \
+            [str(ord.volume) for ord in order_book.orders_by_owner("a")]
+
+    def test_positive_restore_sequential_ids_and_client_ids(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path, id_generator=SequentialIds())
+        for i in range(5):
+            order_book.add_order(order_book.new_order(Decimal(i + 1), Decimal("1"), OrderType.ASK, "o", f"c-{i}"))
+        order_book.remove_order(order_book.order_id_by_client_id("c-1"))
+        order_book.close()
+
+        restored = OrderBook.restore(self.journal_path, id_generator=SequentialIds(start=6))
+        assert restored.client_ids == {"c-0": 1, "c-2": 3, "c-3": 4, "c-4": 5}
+        assert restored.new_order(Decimal("1"), Decimal("1"), OrderType.BID, "o").id == 6
+
+    @params_by_order_type()
+    def test_positive_restore_fills_in_matching_tick_mode_with_type(self, order_type):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True, matching=True, journal_path=self.journal_path)
+        opposite = OrderType.BID if order_type == OrderType.ASK else OrderType.ASK
+        makers = [TickOrder(DEFAULT_TRADING_PAIR, 100, 10, opposite, "maker") for _ in range(3)]
+        order_book.add_orders(makers)
+        order_book.write_snapshot()
+        order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, 100, 15, order_type, "taker"))
+        order_book.close()
+
+        restored = OrderBook.restore(self.journal_path)
+        assert restored.matching and restored.use_ticks
+        assert orders_state(restored) == orders_state(order_book)
+        assert restored.get_order_by(makers[1].id).volume == 5
+
+    def test_positive_restore_ignores_torn_tail_record(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path)
+        orders = [generate_order_obj() for _ in range(3)]
+        for ord in orders:
+            order_book.add_order(ord)
+        order_book.close()
+        segment = os.path.join(self.journal_path, sorted(os.listdir(self.journal_path))[-1])
+        with open(segment, "r+b") as f:
+            f.truncate(os.path.getsize(segment) - 3)
+
+        restored = OrderBook.restore(self.journal_path)
+        assert set(restored.orders_meta) == {ord.id for ord in orders[:2]}
+
+    def test_negative_create_order_book_with_existing_journal(self):
+        OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path).close()
+        with pytest.raises(Exception) as e:
+            OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path)
+        assert "use OrderBook.restore" in str(e.value)
+
+    def test_positive_journal_records_seq_increasing(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, journal_path=self.journal_path)
+        self.fill_order_book(order_book, 6)
+        order_book.close()
+        records = list(Journal(self.journal_path).read_records())
+        assert [i[1] for i in records] == list(range(len(records)))
+        assert records[0][0] == RecordType.CONFIG
+        assert [i[0] for i in records].count(RecordType.ADD) == 6
+        assert [i[0] for i in records].count(RecordType.CANCEL) == 6
@@ -0,0 +1,115 @@
+import urllib.request
+from decimal import Decimal
+from random import Random
+
+import pytest
+
+from concurrent_order_book import ConcurrentOrderBook
+from metrics import LatencyHistogram, start_metrics_server, to_prometheus, write_prometheus
+from order_book import OrderBook, OrderType
+from test_order_book import DEFAULT_TRADING_PAIR, generate_order_obj
+
+
+class TestLatencyHistogram:
+
+    def test_positive_percentiles_within_relative_error(self):
+        rnd = Random(0)
+        values = sorted(int(rnd.lognormvariate(9, 2)) for _ in range(10000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        assert histogram.count == len(values)
+        assert histogram.max == values[-1]
+        for q in (0.5, 0.9, 0.99, 0.999):
+            expected = values[round(q * len(values)) - 1]
+            assert expected <= histogram.percentile(q) <= expected * (1 + 1 / 16) + 1
+
+    def test_positive_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for value in range(32):
+            histogram.record(value)
+        assert [histogram.percentile((value + 1) / 32) for value in range(32)] == list(range(32))
+        assert histogram.cumulative_counts([0, 10, 31, 1000]) == [1, 11, 32, 32]
+
+    def test_positive_bucket_bounds_are_continuous(self):
+        for index in range(1, 900):
+            lowest = LatencyHistogram.bucket_lowest(index)
+            assert LatencyHistogram.bucket_index(lowest) == index
+            assert LatencyHistogram.bucket_index(lowest - 1) == index - 1
+
+
+class TestOrderBookStats:
+
+    def test_positive_not_instrumented_book_has_no_operations(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR)
+        assert type(order_book) is OrderBook
+        order_book.add_order(generate_order_obj(price=Decimal("1"), type=OrderType.ASK))
+        assert order_book.stats() == {
+            "trading_pair": DEFAULT_TRADING_PAIR,
+            "asks": {"levels": 1, "orders": 1, "max_level_orders": 1},
+            "bids": {"levels": 0, "orders": 0, "max_level_orders": 0},
+            "max_level_orders": 1,
+            "operations": {},
+        }
+
+    @pytest.mark.parametrize("order_book_cls", [OrderBook, ConcurrentOrderBook])
+    def test_positive_operations_recorded(self, order_book_cls):
+        order_book = order_book_cls(DEFAULT_TRADING_PAIR, instrument=True)
+        assert isinstance(order_book, order_book_cls)
+        orders = [generate_order_obj(price=Decimal(i % 3 + 1), type=OrderType.BID) for i in range(7)]
+        for ord in orders:
+            order_book.add_order(ord)
+        order_book.remove_order(orders[0].id)
+        with pytest.raises(Exception):
+            order_book.remove_order(orders[0].id)
+        order_book.get_order_by(orders[1].id)
+        assert order_book.orders_by_owner(orders[1].owner_id) == [orders[1]]
+        order_book.market_data
+        order_book.add_orders([generate_order_obj(type=OrderType.ASK)])
+
+        stats = order_book.stats()
+        assert stats["bids"] == {"levels": 3, "orders": 6, "max_level_orders": 2}
+        assert stats["asks"]["orders"] == 1
+        operations = stats["operations"]
+        assert {name: (value["count"], value["errors"]) for name, value in operations.items()} == {
+            "add": (7, 0), "cancel": (2, 1), "lookup": (1, 0), "market_data": (1, 0), "add_batch": (1, 0),
+        }
+        assert 0 < operations["add"]["p50_ns"] <= operations["add"]["p99_ns"] <= operations["add"]["max_ns"]
+
+
+class TestPrometheusExport:
+
+    def setup(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, instrument=True)
+        for i in range(5):
+            self.order_book.add_order(generate_order_obj(price=Decimal("1"), type=OrderType.ASK))
+
+    def test_positive_text_format(self):
+        text = to_prometheus([self.order_book, OrderBook("ETH_USD")])
+        lines = text.splitlines()
+        assert '# TYPE orderbook_operation_latency_seconds histogram' in lines
+        assert 'orderbook_operations_total{trading_pair="BTC_USD",operation="add"} 5' in lines
+        assert 'orderbook_operation_latency_seconds_bucket{trading_pair="BTC_USD",operation="add",le="+Inf"} 5' \
+            in lines
+        assert 'orderbook_orders{trading_pair="BTC_USD",side="asks"} 5' in lines
+        assert 'orderbook_max_level_orders{trading_pair="BTC_USD",side="asks"} 5' in lines
+        assert 'orderbook_levels{trading_pair="ETH_USD",side="bids"} 0' in lines
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith(
+            'orderbook_operation_latency_seconds_bucket{trading_pair="BTC_USD",operation="add"')]
+        assert buckets == sorted(buckets)
+
+    def test_positive_write_file_and_endpoint(self, tmp_path):
+        path = str(tmp_path / "order_book.prom")
+        write_prometheus(path, [self.order_book])
+        with open(path) as f:
+            assert f.read() == to_prometheus([self.order_book])
+
+        server = start_metrics_server([self.order_book], port=0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                assert 'orderbook_operations_total{trading_pair="BTC_USD",operation="add"} 5' in \
+                    response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
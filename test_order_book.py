@@ -1,7 +1,9 @@
 """
 Исходя из задания, проверяться непосредственно будет только класс OrderBook и его методы прописанные в рамках П.2
 """
+import json
 import uuid
+import pickle
 from decimal import Decimal
 from collections import defaultdict
 from random import choice, randint, uniform
@@ -9,7 +11,10 @@ from random import choice, randint, uniform
 import pytest
 from hypothesis import given, strategies as st
 
-from order_book import Order, OrderType, OrderBook
+from order_book import (
+    Order, TickOrder, OrderType, OrderStatus, OrderBook, OrderBookBatchError, OrderList, SequentialIds,
+    SnowflakeIds, to_ticks, MARKET_DATA_ENCODERS, decode_market_data_binary,
+)
 
 
 DEFAULT_TRADING_PAIR = "BTC_USD"
@@ -96,6 +101,63 @@ class TestAddOrderInOrderBook(BaseOrderBookTest):
         assert not self.order_book.bids
 
 
+class TestBatchOrdersInOrderBook(BaseOrderBookTest):
+
+    def test_positive_add_orders_same_as_add_order(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR)
+        price = get_rnd_decimal()
+        orders = [generate_order_obj(price=price) for _ in range(5)] + [generate_order_obj() for _ in range(20)]
+        self.order_book.add_orders(orders)
+        for ord in orders:
+            order_book.add_order(ord)
+        assert self.order_book.market_data == order_book.market_data
+        assert (self.order_book.best_ask, self.order_book.best_bid) == (order_book.best_ask, order_book.best_bid)
+        assert [list(i) for i in self.order_book.asks.values()] == [list(i) for i in order_book.asks.values()]
+        for ord in orders:
+            assert self.order_book.get_order_by(ord.id) is ord
+
+    def test_negative_add_orders_with_invalid_items_nothing_added(self):
+        exist_order = generate_order_obj()
+        self.order_book.add_order(exist_order)
+        valid_order = generate_order_obj()
+        orders = [
+            valid_order,
+            exist_order,
+            generate_order_obj(trading_pair="ETH_USD"),
+            generate_order_obj(type="invalid"),
+            valid_order,
+        ]
+        with pytest.raises(OrderBookBatchError) as e:
+            self.order_book.add_orders(orders)
+        assert sorted(e.value.errors) == [1, 2, 3, 4]
+        assert "Order exist in this OrderBook" in e.value.errors[1]
+        assert "not supported trading pair" in e.value.errors[2]
+        assert "Not supported order.type" in e.value.errors[3]
+        assert "Order exist in this batch" in e.value.errors[4]
+        assert len(self.get_orders_from_asks() + self.get_orders_from_bids()) == 1
+
+    def test_positive_remove_orders(self):
+        price = get_rnd_decimal()
+        orders = [generate_order_obj(price=price, type=OrderType.ASK) for _ in range(5)]
+        orders += [generate_order_obj(type=OrderType.ASK) for _ in range(5)]
+        self.order_book.add_orders(orders)
+        self.order_book.remove_orders([ord.id for ord in orders[:7]])
+        assert self.get_orders_from_asks() == sorted(orders[7:], key=lambda i: i.price)
+        assert self.order_book.market_data == {
+            "asks": TestGetMarketDataFromOrderBook().aggregate_orders(orders[7:]), "bids": []
+        }
+
+    def test_negative_remove_orders_with_invalid_ids_nothing_removed(self):
+        orders = [generate_order_obj() for _ in range(3)]
+        self.order_book.add_orders(orders)
+        with pytest.raises(OrderBookBatchError) as e:
+            self.order_book.remove_orders([orders[0].id, generate_order_obj().id, orders[0].id])
+        assert sorted(e.value.errors) == [1, 2]
+        assert "Not exist order_id=" in e.value.errors[1]
+        assert "Order exist in this batch" in e.value.errors[2]
+        assert len(self.get_orders_from_asks() + self.get_orders_from_bids()) == 3
+
+
 class TestRemoveOrderFromOrderBook(BaseOrderBookTest):
 
     @params_by_order_type()
@@ -166,11 +228,12 @@ class TestGetOrderFromOrderBook(BaseOrderBookTest):
 
 class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
 
-    def aggregate_orders(self, orders):
+    def aggregate_orders(self, orders, order_type=OrderType.ASK):
         data = defaultdict(int)
         for i in orders:
             data[i.price] += i.volume
-        return [{"price": str(price), "quantity": str(data[price])} for price in sorted(data.keys())]
+        prices = sorted(data.keys(), reverse=order_type == OrderType.BID)
+        return [{"price": str(price), "quantity": str(data[price])} for price in prices]
 
     def expected_market_data(self, bids=None, asks=None):
         return {
@@ -186,7 +249,7 @@ class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
             ord = generate_order_obj(price=price, type=OrderType.BID)
             self.order_book.add_order(ord)
             orders.append(ord)
-        expected_market_data = self.expected_market_data(bids=self.aggregate_orders(orders))
+        expected_market_data = self.expected_market_data(bids=self.aggregate_orders(orders, OrderType.BID))
         assert self.order_book.market_data == expected_market_data
         assert len(self.get_orders_from_bids()) == count_of_orders
 
@@ -204,7 +267,7 @@ class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
         orders = [generate_order_obj(type=OrderType.BID) for _ in range(10)]
         for ord in orders:
             self.order_book.add_order(ord)
-        expected_market_data = self.expected_market_data(bids=self.aggregate_orders(orders))
+        expected_market_data = self.expected_market_data(bids=self.aggregate_orders(orders, OrderType.BID))
         assert self.order_book.market_data == expected_market_data
         assert len(self.get_orders_from_bids()) == 10
 
@@ -225,7 +288,7 @@ class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
         for a_ord in ask_orders:
             self.order_book.add_order(a_ord)
         expected_market_data = self.expected_market_data(
-            bids=self.aggregate_orders(bid_orders), asks=self.aggregate_orders(ask_orders)
+            bids=self.aggregate_orders(bid_orders, OrderType.BID), asks=self.aggregate_orders(ask_orders)
         )
         assert self.order_book.market_data == expected_market_data
         assert len(self.get_orders_from_bids()) == count_of_orders
@@ -248,7 +311,7 @@ class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
             orders.append(ord)
         deleted_order = orders.pop(randint(0, len(orders) - 1))
         self.order_book.remove_order(deleted_order.id)
-        expected_market_data = self.expected_market_data(**{order_type + 's': self.aggregate_orders(orders)})
+        expected_market_data = self.expected_market_data(**{order_type + 's': self.aggregate_orders(orders, order_type)})
         assert self.order_book.market_data == expected_market_data
 
     def test_positive_market_data_without_data(self):
@@ -261,11 +324,11 @@ class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
         for ord in orders:
             order_book.add_order(ord)
         old_market_data = order_book.market_data
-        orders = sorted(orders, key=lambda i: i.price)
+        orders = sorted(orders, key=lambda i: i.price, reverse=True)
         delete_order = orders[0]
         order_book.remove_order(delete_order.id)
         assert order_book.market_data != old_market_data
-        expected_data = self.expected_market_data(bids=self.aggregate_orders(orders[1:3]))
+        expected_data = self.expected_market_data(bids=self.aggregate_orders(orders[1:3], OrderType.BID))
         assert order_book.market_data == expected_data
 
     def test_market_data_check_max_ask_print_size_limiter(self):
@@ -281,3 +344,728 @@ class TestGetMarketDataFromOrderBook(BaseOrderBookTest):
         expected_data = self.expected_market_data(asks=self.aggregate_orders(orders[1:3]))
         assert order_book.market_data == expected_data
 
+
+
+class TestDepthFromOrderBook(BaseOrderBookTest):
+
+    @params_by_order_type()
+    def test_positive_depth_from_best_price_with_type(self, order_type):
+        orders = [generate_order_obj(type=order_type) for _ in range(10)]
+        for ord in orders:
+            self.order_book.add_order(ord)
+        prices = sorted({i.price for i in orders}, reverse=order_type == OrderType.BID)
+        depth = self.order_book.depth(order_type, 3)
+        assert [price for price, _ in depth] == prices[:3]
+        for price, quantity in depth:
+            assert quantity == sum(i.volume for i in orders if i.price == price)
+
+    def test_positive_depth_more_than_levels(self):
+        ord = generate_order_obj(type=OrderType.BID)
+        self.order_book.add_order(ord)
+        assert self.order_book.depth(OrderType.BID, 500) == [(ord.price, ord.volume)]
+        assert self.order_book.depth(OrderType.ASK, 500) == []
+
+    def test_negative_depth_with_invalid_side(self):
+        with pytest.raises(Exception) as e:
+            self.order_book.depth("invalid", 1)
+        assert "Not supported type_" in str(e.value)
+
+
+class TestTopOfBookFromOrderBook(BaseOrderBookTest):
+
+    def test_positive_top_of_book_without_data(self):
+        assert self.order_book.best_ask is None
+        assert self.order_book.best_bid is None
+        assert self.order_book.spread is None
+        assert self.order_book.mid is None
+
+    def test_positive_top_of_book_with_bids_and_asks(self):
+        asks = [generate_order_obj(price=Decimal(price), type=OrderType.ASK) for price in ("12", "11", "13")]
+        bids = [generate_order_obj(price=Decimal(price), type=OrderType.BID) for price in ("8", "10", "9")]
+        for ord in asks + bids:
+            self.order_book.add_order(ord)
+        assert self.order_book.best_ask == Decimal("11")
+        assert self.order_book.best_bid == Decimal("10")
+        assert self.order_book.spread == Decimal("1")
+        assert self.order_book.mid == Decimal("10.5")
+
+    @params_by_order_type()
+    def test_positive_top_of_book_after_remove_best_level_with_type(self, order_type):
+        orders = [generate_order_obj(type=order_type) for _ in range(5)]
+        for ord in orders:
+            self.order_book.add_order(ord)
+        orders = sorted(orders, key=lambda i: i.price, reverse=order_type == OrderType.BID)
+        self.order_book.remove_order(orders[0].id)
+        best = self.order_book.best_ask if order_type == OrderType.ASK else self.order_book.best_bid
+        assert best == orders[1].price
+
+    def test_positive_market_data_cached_while_visible_levels_not_changed(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, 2, 2)
+        for price in ("1", "2"):
+            order_book.add_order(generate_order_obj(price=Decimal(price), type=OrderType.ASK))
+        market_data = order_book.market_data
+        assert order_book.market_data is market_data
+        hidden_order = generate_order_obj(price=Decimal("3"), type=OrderType.ASK)
+        order_book.add_order(hidden_order)
+        order_book.remove_order(hidden_order.id)
+        assert order_book.market_data is market_data
+        order_book.add_order(generate_order_obj(price=Decimal("2"), type=OrderType.ASK))
+        assert order_book.market_data is not market_data
+
+
+class TestTickOrderBook(BaseOrderBookTest):
+
+    def setup(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True)
+
+    def test_positive_market_data_same_as_decimal_order_book(self):
+        decimal_order_book = OrderBook(DEFAULT_TRADING_PAIR)
+        values = ["2", "2.5", "2.50000000", "0.00000001", "0.0000010", "1E+1", "17.12345678"]
+        orders = [
+            generate_order_obj(price=Decimal(choice(values)), volume=Decimal(choice(values)))
+            for _ in range(50)
+        ]
+        orders.extend(generate_order_obj() for _ in range(50))
+        for ord in orders:
+            self.order_book.add_order(ord)
+            decimal_order_book.add_order(ord)
+        for ord in orders[::3]:
+            self.order_book.remove_order(ord.id)
+            decimal_order_book.remove_order(ord.id)
+        assert self.order_book.market_data == decimal_order_book.market_data
+        assert self.order_book.best_ask == to_ticks(decimal_order_book.best_ask)
+        assert self.order_book.best_bid == to_ticks(decimal_order_book.best_bid)
+
+    def test_positive_partial_fill_formatted_same_as_decimal_order_book(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True, matching=True)
+        decimal_order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True)
+        bid = generate_order_obj(price=Decimal("99"), volume=Decimal("2"), type=OrderType.BID)
+        ask = generate_order_obj(price=Decimal("99"), volume=Decimal("0.00000010"), type=OrderType.ASK)
+        for ord in (bid, ask):
+            order_book.add_order(ord)
+            decimal_order_book.add_order(ord)
+        assert order_book.market_data == decimal_order_book.market_data == {
+            "asks": [], "bids": [{"price": "99", "quantity": "1.99999990"}],
+        }
+        assert str(order_book.get_order_by(bid.id).volume) == "1.99999990"
+
+    def test_positive_fills_market_data_same_as_decimal_order_book(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True, matching=True)
+        decimal_order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True)
+        prices = ["9", "10", "10.50", "11"]
+        volumes = ["2", "2.5", "2.50000000", "0.00000010", "0.0000010", "1E+1", "1.2345678"]
+        orders = [
+            generate_order_obj(price=Decimal(choice(prices)), volume=Decimal(choice(volumes)))
+            for _ in range(300)
+        ]
+        for ord in orders:
+            assert [(t.maker_order_id, to_ticks(t.volume) if not isinstance(t.volume, int) else t.volume)
+                    for t in decimal_order_book.add_order(ord)] == \
+                [(t.maker_order_id, t.volume) for t in order_book.add_order(ord)]
+            assert order_book.market_data == decimal_order_book.market_data
+        for order_id in decimal_order_book.orders_meta:
+            assert str(order_book.get_order_by(order_id).volume) == \
+                str(decimal_order_book.get_order_by(order_id).volume)
+
+    def test_positive_mid_is_exact_in_ticks(self):
+        self.order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, 3, 1, OrderType.ASK, "owner"))
+        self.order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, 1, 1, OrderType.BID, "owner"))
+        assert self.order_book.mid == 2 and type(self.order_book.mid) is Decimal
+        self.order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, 2, 1, OrderType.BID, "owner"))
+        assert self.order_book.mid == Decimal("2.5") and type(self.order_book.mid) is Decimal
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True)
+        big = 10 ** 20 + 1
+        order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, big, 1, OrderType.BID, "owner"))
+        order_book.add_order(TickOrder(DEFAULT_TRADING_PAIR, big + 2, 1, OrderType.ASK, "owner"))
+        assert order_book.mid == Decimal(big + 1)
+
+    def test_positive_add_tick_orders(self):
+        ask = TickOrder(DEFAULT_TRADING_PAIR, 250000000, 100000000, OrderType.ASK, "owner")
+        bid = TickOrder(DEFAULT_TRADING_PAIR, 200000000, 1, OrderType.BID, "owner")
+        self.order_book.add_order(ask)
+        self.order_book.add_order(bid)
+        assert self.order_book.get_order_by(ask.id) is ask
+        assert self.order_book.spread == 50000000
+        assert self.order_book.depth(OrderType.BID, 1) == [(200000000, 1)]
+        assert self.order_book.market_data == {
+            "asks": [{"price": "2.50000000", "quantity": "1.00000000"}],
+            "bids": [{"price": "2.00000000", "quantity": "1E-8"}],
+        }
+
+    def test_negative_add_tick_order_in_decimal_order_book(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR)
+        ord = TickOrder(DEFAULT_TRADING_PAIR, 1, 1, OrderType.ASK, "owner")
+        with pytest.raises(Exception) as e:
+            order_book.add_order(ord)
+        assert "Tick orders supported only" in str(e.value)
+        assert not order_book.asks
+
+    def test_negative_create_tick_order_with_decimal(self):
+        with pytest.raises(Exception) as e:
+            TickOrder(DEFAULT_TRADING_PAIR, Decimal("1"), 1, OrderType.ASK, "owner")
+        assert "should be int ticks" in str(e.value)
+
+
+class TestMatchingOrderBook(BaseOrderBookTest):
+
+    def setup(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True)
+
+    def add_asks(self, *prices_and_volumes):
+        orders = [
+            generate_order_obj(price=Decimal(price), volume=Decimal(volume), type=OrderType.ASK)
+            for price, volume in prices_and_volumes
+        ]
+        for ord in orders:
+            assert self.order_book.add_order(ord) == []
+        return orders
+
+    def test_positive_not_crossing_order_is_stored(self):
+        self.add_asks(("10", "1"))
+        bid = generate_order_obj(price=Decimal("9"), volume=Decimal("1"), type=OrderType.BID)
+        assert self.order_book.add_order(bid) == []
+        assert self.order_book.best_bid == Decimal("9")
+        assert self.order_book.best_ask == Decimal("10")
+
+    def test_positive_partial_fill_of_resting_order_keeps_priority(self):
+        first, second = self.add_asks(("10", "5"), ("10", "1"))
+        bid = generate_order_obj(price=Decimal("10"), volume=Decimal("2"), type=OrderType.BID)
+        trades = self.order_book.add_order(bid)
+        assert [(i.price, i.volume, i.maker_order_id, i.taker_order_id, i.maker_status) for i in trades] == [
+            (Decimal("10"), Decimal("2"), first.id, bid.id, OrderStatus.TRADE)
+        ]
+        assert [i.id for i in self.order_book.asks[Decimal("10")]] == [first.id, second.id]
+        assert self.order_book.get_order_by(first.id).volume == Decimal("3")
+        assert self.order_book.market_data == {"asks": [{"price": "10", "quantity": "4"}], "bids": []}
+        with pytest.raises(Exception):
+            self.order_book.get_order_by(bid.id)
+
+    def test_positive_sweep_levels_by_price_time_priority_and_store_rest(self):
+        orders = self.add_asks(("11", "1"), ("10", "1"), ("10", "2"), ("12", "1"))
+        bid = generate_order_obj(price=Decimal("11"), volume=Decimal("5"), type=OrderType.BID)
+        trades = self.order_book.add_order(bid)
+        assert [(i.price, i.maker_order_id, i.maker_status) for i in trades] == [
+            (Decimal("10"), orders[1].id, OrderStatus.CLOSE),
+            (Decimal("10"), orders[2].id, OrderStatus.CLOSE),
+            (Decimal("11"), orders[0].id, OrderStatus.CLOSE),
+        ]
+        assert self.order_book.get_order_by(bid.id).volume == Decimal("1")
+        assert self.order_book.market_data == {
+            "asks": [{"price": "12", "quantity": "1"}],
+            "bids": [{"price": "11", "quantity": "1"}],
+        }
+        assert len(self.order_book.orders_meta) == 2
+
+    def test_positive_ask_matched_with_bids_in_tick_mode(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True, matching=True)
+        bid = generate_order_obj(price=Decimal("10"), volume=Decimal("2"), type=OrderType.BID)
+        self.order_book.add_order(bid)
+        ask = generate_order_obj(price=Decimal("9"), volume=Decimal("0.5"), type=OrderType.ASK)
+        trades = self.order_book.add_order(ask)
+        assert [(i.price, i.volume) for i in trades] == [(to_ticks(Decimal("10")), to_ticks(Decimal("0.5")))]
+        assert self.order_book.get_order_by(bid.id).volume == Decimal("1.5")
+        assert self.order_book.market_data == {"asks": [], "bids": [{"price": "10", "quantity": "1.5"}]}
+
+    def test_positive_add_orders_matched_in_batch_order(self):
+        ask = generate_order_obj(price=Decimal("10"), volume=Decimal("1"), type=OrderType.ASK)
+        bid = generate_order_obj(price=Decimal("10"), volume=Decimal("1"), type=OrderType.BID)
+        trades = self.order_book.add_orders([ask, bid])
+        assert [(i.maker_order_id, i.taker_order_id) for i in trades] == [(ask.id, bid.id)]
+        assert not self.order_book.asks and not self.order_book.bids
+
+
+class TestLevelUpdatesFromOrderBook(BaseOrderBookTest):
+
+    def setup(self):
+        super().setup()
+        self.updates = []
+        self.order_book.subscribe(self.updates.extend)
+
+    def test_positive_level_updates_on_add_and_remove(self):
+        price = get_rnd_decimal()
+        first, second = [generate_order_obj(price=price, type=OrderType.BID) for _ in range(2)]
+        self.order_book.add_order(first)
+        self.order_book.add_orders([second])
+        self.order_book.remove_order(first.id)
+        self.order_book.remove_order(second.id)
+        assert [(i.seq, i.side, i.price, i.quantity) for i in self.updates] == [
+            (1, OrderType.BID, price, first.volume),
+            (2, OrderType.BID, price, first.volume + second.volume),
+            (3, OrderType.BID, price, second.volume),
+            (4, OrderType.BID, price, 0),
+        ]
+        assert self.order_book.seq == 4
+
+    def test_positive_batch_sends_one_update_per_level(self):
+        price = get_rnd_decimal()
+        orders = [generate_order_obj(price=price, type=OrderType.ASK) for _ in range(5)]
+        self.order_book.add_orders(orders)
+        assert len(self.updates) == 1
+        assert self.updates[0].quantity == sum(i.volume for i in orders)
+
+    def test_positive_unsubscribe(self):
+        self.order_book.unsubscribe(self.updates.extend)
+        self.order_book.add_order(generate_order_obj())
+        assert not self.updates
+        assert self.order_book.seq == 1
+
+    @pytest.mark.parametrize("matching", [False, True], ids=["without_matching", "matching"])
+    def test_positive_client_book_from_snapshot_and_updates(self, matching):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True, matching=matching)
+        orders = [generate_order_obj(price=Decimal(randint(95, 105))) for _ in range(20)]
+        self.order_book.add_orders(orders)
+        seq, snapshot = self.order_book.snapshot()
+        client_book = {side: dict(levels) for side, levels in (("ask", snapshot["asks"]), ("bid", snapshot["bids"]))}
+
+        updates = []
+        self.order_book.subscribe(updates.extend)
+        for ord in orders[::2]:
+            if ord.id in self.order_book.orders_meta:
+                self.order_book.remove_order(ord.id)
+        for _ in range(20):
+            self.order_book.add_order(generate_order_obj(price=Decimal(randint(95, 105))))
+
+        for update in updates:
+            assert update.seq > seq
+            seq = update.seq
+            if update.quantity:
+                client_book[update.side][update.price] = update.quantity
+            else:
+                del client_book[update.side][update.price]
+        _, snapshot = self.order_book.snapshot()
+        assert sorted(client_book["ask"].items()) == snapshot["asks"]
+        assert sorted(client_book["bid"].items(), reverse=True) == snapshot["bids"]
+
+
+class TestOrderIdsInOrderBook(BaseOrderBookTest):
+
+    def test_positive_sequential_ids(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True, id_generator=SequentialIds(start=10))
+        orders = [self.order_book.new_order(Decimal("1"), Decimal("2"), OrderType.ASK, "owner") for _ in range(3)]
+        assert [ord.id for ord in orders] == [10, 11, 12]
+        tick_order = self.order_book.new_order(10 ** 8, 10 ** 8, OrderType.BID, "owner")
+        assert isinstance(tick_order, TickOrder) and tick_order.id == 13
+        self.order_book.add_orders(orders + [tick_order])
+        assert self.order_book.get_order_by(11) == orders[1]
+
+    def test_positive_snowflake_ids_increase_and_have_worker(self):
+        generator = SnowflakeIds(worker_id=5)
+        ids = [generator() for _ in range(10000)]
+        assert ids == sorted(set(ids))
+        assert all(order_id >> 12 & 1023 == 5 and order_id < 2 ** 63 for order_id in ids)
+
+    def test_positive_client_id_mapping_follows_resting_orders(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True, id_generator=SequentialIds())
+        maker = self.order_book.new_order(Decimal("5"), Decimal("2"), OrderType.ASK, "maker", client_id="m-1")
+        other = self.order_book.new_order(Decimal("6"), Decimal("1"), OrderType.ASK, "maker", client_id="m-2")
+        self.order_book.add_orders([maker, other])
+        assert self.order_book.order_id_by_client_id("m-1") == maker.id
+
+        self.order_book.add_order(self.order_book.new_order(Decimal("5"), Decimal("1"), OrderType.BID, "taker"))
+        assert self.order_book.order_id_by_client_id("m-1") == maker.id  # partially filled
+        self.order_book.add_order(self.order_book.new_order(Decimal("5"), Decimal("1"), OrderType.BID, "taker"))
+        self.order_book.remove_order(self.order_book.order_id_by_client_id("m-2"))
+        assert self.order_book.client_ids == {}
+        with pytest.raises(KeyError):
+            self.order_book.order_id_by_client_id("m-1")
+
+    def test_negative_duplicate_client_id(self):
+        ord = generate_order_obj(client_id="c-1")
+        self.order_book.add_order(ord)
+        with pytest.raises(Exception, match="same client_id"):
+            self.order_book.add_order(generate_order_obj(client_id="c-1"))
+        with pytest.raises(OrderBookBatchError) as e:
+            self.order_book.add_orders([generate_order_obj(client_id="c-2"), generate_order_obj(client_id="c-2")])
+        assert list(e.value.errors) == [1]
+        self.order_book.remove_order(ord.id)
+        self.order_book.add_order(generate_order_obj(client_id="c-1"))
+
+
+class TestOwnerOrdersInOrderBook(BaseOrderBookTest):
+
+    def test_positive_orders_by_owner_in_add_order(self):
+        orders = [generate_order_obj(owner_id="owner", price=Decimal(i % 3 + 1)) for i in range(6)]
+        self.order_book.add_orders(orders[:3])
+        self.order_book.add_order(generate_order_obj(owner_id="other"))
+        for ord in orders[3:]:
+            self.order_book.add_order(ord)
+        self.order_book.remove_order(orders[1].id)
+        assert self.order_book.orders_by_owner("owner") == orders[:1] + orders[2:]
+        assert self.order_book.orders_by_owner("unknown") == []
+
+    @pytest.mark.parametrize("side", [None, OrderType.ASK, OrderType.BID], ids=["both", "ASK", "BID"])
+    def test_positive_cancel_all_removes_levels_once(self, side):
+        updates = []
+        self.order_book.subscribe(updates.extend)
+        orders = [generate_order_obj(owner_id="owner", price=Decimal(i % 4 + 1), type=choice([OrderType.ASK,
+                  OrderType.BID])) for i in range(20)]
+        others = [generate_order_obj(owner_id="other", price=Decimal("1")) for _ in range(3)]
+        self.order_book.add_orders(orders + others)
+        updates.clear()
+
+        cancelled = [ord for ord in orders if side is None or ord.type == side]
+        assert set(self.order_book.cancel_all("owner", side)) == {ord.id for ord in cancelled}
+        assert len(updates) == len({(ord.type, ord.price) for ord in cancelled})
+        assert set(self.order_book.orders_by_owner("owner")) == {ord for ord in orders if ord not in cancelled}
+        assert set(self.order_book.orders_by_owner("other")) == set(others)
+        for asks_or_bids in (self.order_book.asks, self.order_book.bids):
+            for order_list in asks_or_bids.values():
+                assert order_list.quantity > 0
+                assert all(ord.owner_id == "other" or ord not in cancelled for ord in order_list)
+        assert self.order_book.cancel_all("owner", side) == []
+
+    def test_positive_owner_index_follows_fills(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True)
+        makers = [generate_order_obj(owner_id="maker", price=Decimal("5"), volume=Decimal("1"), type=OrderType.ASK)
+                  for _ in range(3)]
+        self.order_book.add_orders(makers)
+        self.order_book.add_order(generate_order_obj(owner_id="taker", price=Decimal("5"), volume=Decimal("1.5"),
+                                                     type=OrderType.BID))
+        assert [(ord.id, ord.volume) for ord in self.order_book.orders_by_owner("maker")] == [
+            (makers[1].id, Decimal("0.5")), (makers[2].id, Decimal("1")),
+        ]
+        assert self.order_book.orders_by_owner("taker") == []
+        self.order_book.cancel_all("maker")
+        assert self.order_book.owner_orders == {}
+        assert not self.order_book.asks
+
+    def test_negative_cancel_all_with_invalid_side(self):
+        with pytest.raises(Exception, match="Not supported"):
+            self.order_book.cancel_all("owner", "invalid")
+
+
+class TestPriceRangeFromOrderBook(BaseOrderBookTest):
+
+    def fill(self, use_ticks=False):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=use_ticks)
+        orders = [generate_order_obj(price=Decimal(randint(1, 30))) for _ in range(100)]
+        self.order_book.add_orders(orders)
+        return orders
+
+    @params_by_order_type()
+    @pytest.mark.parametrize("lo, hi", [(5, 20), (None, 10), (10, None), (None, None), (20, 5), (31, 40)])
+    def test_positive_levels_between(self, order_type, lo, hi):
+        self.fill()
+        lo = None if lo is None else Decimal(lo)
+        hi = None if hi is None else Decimal(hi)
+        expected = [(price, quantity) for price, quantity in self.order_book.depth(order_type, None)
+                    if (lo is None or price >= lo) and (hi is None or price <= hi)]
+        assert self.order_book.levels_between(order_type, lo, hi) == expected
+
+    @params_by_order_type()
+    def test_positive_quantity_up_to(self, order_type):
+        orders = self.fill()
+        for price in (Decimal("0.5"), Decimal("10"), Decimal("15.5"), Decimal("31")):
+            is_included = (lambda ord: ord.price <= price) if order_type == OrderType.ASK else \
+                (lambda ord: ord.price >= price)
+            assert self.order_book.quantity_up_to(order_type, price) == sum(
+                ord.volume for ord in orders if ord.type == order_type and is_included(ord))
+
+    def test_positive_quantity_up_to_in_tick_mode(self):
+        self.fill(use_ticks=True)
+        price = to_ticks(Decimal("12"))
+        assert self.order_book.quantity_up_to(OrderType.ASK, price) == sum(
+            quantity for level_price, quantity in self.order_book.depth(OrderType.ASK, None) if level_price <= price)
+
+    @params_by_order_type()
+    def test_positive_cancel_range_outside_band(self, order_type):
+        orders = self.fill()
+        updates = []
+        self.order_book.subscribe(updates.extend)
+        if order_type == OrderType.ASK:
+            lo, hi = Decimal("20"), None
+        else:
+            lo, hi = None, Decimal("10")
+        cancelled = [ord for ord in orders if ord.type == order_type and (lo is None or ord.price >= lo) and
+                     (hi is None or ord.price <= hi)]
+        assert set(self.order_book.cancel_range(order_type, lo, hi)) == {ord.id for ord in cancelled}
+        assert self.order_book.levels_between(order_type, lo, hi) == []
+        assert {(update.price, update.quantity) for update in updates} == {(ord.price, 0) for ord in cancelled}
+        assert all(ord.id not in self.order_book.orders_meta for ord in cancelled)
+        assert len(self.order_book.orders_meta) == len(orders) - len(cancelled)
+        assert self.order_book.cancel_range(order_type, lo, hi) == []
+
+    def test_negative_range_of_invalid_side(self):
+        with pytest.raises(Exception, match="Not supported"):
+            self.order_book.levels_between("invalid", None, None)
+
+
+class TestAmendOrderInOrderBook(BaseOrderBookTest):
+
+    def add_level(self, order_type, price=Decimal("10"), count=3):
+        orders = [generate_order_obj(price=price, volume=Decimal("2"), type=order_type) for _ in range(count)]
+        self.order_book.add_orders(orders)
+        return orders
+
+    @params_by_order_type()
+    @pytest.mark.parametrize("use_ticks", [False, True], ids=["decimal", "ticks"])
+    def test_positive_reduce_volume_keeps_priority(self, order_type, use_ticks):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=use_ticks)
+        orders = self.add_level(order_type)
+        assert self.order_book.amend_order(orders[0].id, new_volume=Decimal("0.5")) == []
+        order_list = self.order_book._get_side(order_type).peekitem(0)[1]
+        assert [ord.id for ord in order_list] == [ord.id for ord in orders]
+        amended = self.order_book.get_order_by(orders[0].id)
+        assert (amended.volume, amended.ts) == (Decimal("0.5"), orders[0].ts)
+        assert self.order_book.market_data[f"{order_type}s"] == [{"price": "10", "quantity": "4.5"}]
+
+    def test_positive_amend_formatted_same_as_decimal_order_book(self):
+        tick_order_book = OrderBook(DEFAULT_TRADING_PAIR, use_ticks=True)
+        orders = self.add_level(OrderType.ASK)
+        tick_order_book.add_orders(orders)
+        for order_book in (self.order_book, tick_order_book):
+            order_book.amend_order(orders[0].id, new_volume=Decimal("1.50"))
+            order_book.amend_order(orders[1].id, new_volume=Decimal("1.2500"))
+            order_book.amend_order(orders[2].id, new_volume=Decimal("3.0"))
+        assert tick_order_book.market_data == self.order_book.market_data == {
+            "asks": [{"price": "10", "quantity": "5.7500"}], "bids": [],
+        }
+        for ord in orders:
+            assert str(tick_order_book.get_order_by(ord.id).volume) == str(self.order_book.get_order_by(ord.id).volume)
+
+    @params_by_order_type()
+    def test_positive_increase_volume_loses_priority(self, order_type):
+        orders = self.add_level(order_type)
+        self.order_book.amend_order(orders[0].id, new_volume=Decimal("3"))
+        order_list = self.order_book._get_side(order_type).peekitem(0)[1]
+        assert [ord.id for ord in order_list] == [ord.id for ord in orders[1:] + orders[:1]]
+        assert order_list.quantity == Decimal("7")
+
+    @params_by_order_type()
+    def test_positive_change_price_moves_order(self, order_type):
+        updates = []
+        self.order_book.subscribe(updates.extend)
+        orders = self.add_level(order_type, count=1) + [generate_order_obj(type=order_type, client_id="client")]
+        self.order_book.add_order(orders[1])
+        updates.clear()
+        self.order_book.amend_order(orders[0].id, new_price=Decimal("11"), new_volume=Decimal("1"))
+        self.order_book.amend_order(orders[1].id, new_price=Decimal("10"))
+
+        amended = self.order_book.get_order_by(orders[0].id)
+        assert (amended.price, amended.volume, amended.owner_id) == (Decimal("11"), Decimal("1"), orders[0].owner_id)
+        assert [(update.price, update.quantity) for update in updates[:2]] == [(Decimal("10"), 0), (Decimal("11"), 1)]
+        assert self.order_book.order_id_by_client_id("client") == orders[1].id
+        assert [ord.id for ord in self.order_book.orders_by_owner(orders[0].owner_id)] == [orders[0].id]
+        assert Decimal("10") in self.order_book._get_side(order_type)
+        assert len(self.order_book.orders_meta) == 2
+
+    def test_positive_change_price_crosses_in_matching_mode(self):
+        self.order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True)
+        maker = generate_order_obj(price=Decimal("10"), volume=Decimal("1"), type=OrderType.ASK)
+        bid = generate_order_obj(price=Decimal("9"), volume=Decimal("3"), type=OrderType.BID)
+        self.order_book.add_orders([maker, bid])
+        trades = self.order_book.amend_order(bid.id, new_price=Decimal("10"))
+        assert [(trade.maker_order_id, trade.taker_order_id, trade.volume) for trade in trades] == [
+            (maker.id, bid.id, Decimal("1")),
+        ]
+        assert self.order_book.get_order_by(bid.id).volume == Decimal("2")
+        assert not self.order_book.asks
+
+    def test_negative_amend_with_invalid_values(self):
+        ord = self.add_level(OrderType.ASK, count=1)[0]
+        market_data = self.order_book.market_data
+        for kwargs in ({}, {"new_volume": Decimal("0")}, {"new_volume": Decimal("1.000000001")},
+                       {"new_price": Decimal("-1")}, {"new_volume": 1}):
+            with pytest.raises(Exception):
+                self.order_book.amend_order(ord.id, **kwargs)
+        with pytest.raises(KeyError):
+            self.order_book.amend_order(b"unknown", new_volume=Decimal("1"))
+        assert self.order_book.market_data == market_data
+        assert self.order_book.get_order_by(ord.id) is ord
+        assert self.order_book.amend_order(ord.id, new_volume=ord.volume, new_price=ord.price) == []
+
+
+class TestEncodedMarketDataFromOrderBook(BaseOrderBookTest):
+
+    def test_positive_json_and_binary_encodings(self):
+        orders = [generate_order_obj(type=choice([OrderType.ASK, OrderType.BID])) for _ in range(20)]
+        for ord in orders:
+            self.order_book.add_order(ord)
+        market_data = self.order_book.market_data
+        assert json.loads(bytes(self.order_book.encoded_market_data())) == market_data
+        assert decode_market_data_binary(self.order_book.encoded_market_data("binary")) == {
+            side: [(to_ticks(Decimal(level["price"])), to_ticks(Decimal(level["quantity"]))) for level in levels]
+            for side, levels in market_data.items()
+        }
+
+    def test_positive_buffer_cached_until_visible_levels_change(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, 2, 2)
+        for price in ("1", "2", "3"):
+            order_book.add_order(generate_order_obj(price=Decimal(price), type=OrderType.ASK))
+        buffer = order_book.encoded_market_data()
+        assert buffer.readonly
+        assert order_book.encoded_market_data() is buffer
+        order_book.add_order(generate_order_obj(price=Decimal("4"), type=OrderType.ASK))
+        assert order_book.encoded_market_data() is buffer
+        order_book.add_order(generate_order_obj(price=Decimal("1"), type=OrderType.ASK))
+        new_buffer = order_book.encoded_market_data()
+        assert new_buffer is not buffer
+        assert json.loads(bytes(new_buffer)) == order_book.market_data
+
+    @pytest.mark.parametrize("use_ticks", [False, True], ids=["decimal", "ticks"])
+    def test_positive_binary_encoding_of_visible_levels_only(self, use_ticks):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, 2, 3, use_ticks=use_ticks)
+        for price, order_type in (("1", OrderType.ASK), ("2.50", OrderType.ASK), ("3", OrderType.ASK),
+                                  ("0.5", OrderType.BID), ("0.25", OrderType.BID)):
+            order_book.add_order(generate_order_obj(price=Decimal(price), volume=Decimal("1.5"), type=order_type))
+        assert decode_market_data_binary(order_book.encoded_market_data("binary")) == {
+            "asks": [(100000000, 150000000), (250000000, 150000000)],
+            "bids": [(50000000, 150000000), (25000000, 150000000)],
+        }
+
+    def test_negative_binary_encoding_of_too_large_level(self):
+        self.order_book.add_order(generate_order_obj(price=Decimal("1"), volume=Decimal(10 ** 12), type=OrderType.ASK))
+        with pytest.raises(Exception, match="2 \\*\\* 63"):
+            self.order_book.encoded_market_data("binary")
+        assert json.loads(bytes(self.order_book.encoded_market_data()))["asks"][0]["quantity"] == str(10 ** 12)
+
+    def test_positive_own_encoder(self, monkeypatch):
+        monkeypatch.setitem(MARKET_DATA_ENCODERS, "levels",
+                            lambda order_book, market_data: b"%d" % len(market_data["asks"]))
+        self.order_book.add_order(generate_order_obj(type=OrderType.ASK))
+        assert self.order_book.encoded_market_data("levels") == b"1"
+        with pytest.raises(Exception):
+            self.order_book.encoded_market_data("unknown")
+
+
+class TestExpireOrdersInOrderBook(BaseOrderBookTest):
+
+    def test_positive_expire_due_orders_only(self):
+        updates = []
+        self.order_book.subscribe(updates.extend)
+        orders = [generate_order_obj(price=Decimal(i % 3 + 1), type=OrderType.ASK, expire_ts=100 + i) for i in range(6)]
+        gtc = generate_order_obj(price=Decimal("1"), type=OrderType.ASK)
+        self.order_book.add_orders(orders + [gtc])
+        assert self.order_book.next_expire_ts == 100
+        updates.clear()
+
+        assert self.order_book.expire_orders(now=99) == []
+        assert [ord.id for ord in self.order_book.expire_orders(now=104)] == [ord.id for ord in orders[:5]]
+        assert {update.price: update.quantity for update in updates} == {
+            Decimal("1"): gtc.volume, Decimal("2"): 0, Decimal("3"): orders[5].volume,
+        }
+        assert Decimal("2") not in self.order_book.asks
+        assert set(self.order_book.orders_meta) == {orders[5].id, gtc.id}
+        assert self.order_book.next_expire_ts == 105
+
+    def test_positive_removed_and_amended_orders_are_skipped(self):
+        orders = [generate_order_obj(price=Decimal("1"), type=OrderType.BID, expire_ts=100) for _ in range(3)]
+        self.order_book.add_orders(orders)
+        self.order_book.remove_order(orders[0].id)
+        self.order_book.amend_order(orders[1].id, new_price=Decimal("2"))
+        assert [ord.id for ord in self.order_book.expire_orders(now=100)] == [orders[1].id, orders[2].id]
+        assert not self.order_book.bids and not self.order_book.orders_meta
+        assert self.order_book.expire_orders(now=200) == []
+        assert self.order_book.next_expire_ts is None
+
+    def test_positive_expiry_heap_is_bounded_by_resting_orders(self):
+        for _ in range(3000):
+            ord = generate_order_obj(expire_ts=2 ** 62)
+            self.order_book.add_order(ord)
+            self.order_book.remove_order(ord.id)
+        assert len(self.order_book._expiry_heap) <= 1025
+
+    def test_positive_expiry_heap_is_bounded_by_amended_orders(self):
+        ord = generate_order_obj(price=Decimal("1"), type=OrderType.ASK, expire_ts=2 ** 62)
+        self.order_book.add_order(ord)
+        for i in range(3000):
+            self.order_book.amend_order(ord.id, new_price=Decimal(i % 2 + 2))
+        assert len(self.order_book._expiry_heap) == 1
+        assert [expired.id for expired in self.order_book.expire_orders(now=2 ** 62)] == [ord.id]
+
+    def test_positive_stale_entries_do_not_touch_levels(self):
+        updates = []
+        self.order_book.subscribe(updates.extend)
+        ord = generate_order_obj(id=b"x", price=Decimal("1"), type=OrderType.ASK, expire_ts=100)
+        self.order_book.add_order(ord)
+        self.order_book.remove_order(ord.id)
+        self.order_book.add_order(generate_order_obj(id=b"x", price=Decimal("1"), type=OrderType.ASK,
+                                                     expire_ts=500))
+        updates.clear()
+        seq = self.order_book.seq
+        assert self.order_book.expire_orders(now=200) == []
+        assert updates == [] and self.order_book.seq == seq
+        assert [expired.id for expired in self.order_book.expire_orders(now=500)] == [b"x"]
+
+    def test_positive_immediate_or_cancel_rest_is_not_stored(self):
+        order_book = OrderBook(DEFAULT_TRADING_PAIR, matching=True)
+        maker = generate_order_obj(price=Decimal("10"), volume=Decimal("1"), type=OrderType.ASK)
+        order_book.add_order(maker)
+        taker = generate_order_obj(price=Decimal("11"), volume=Decimal("3"), type=OrderType.BID)
+        ioc = generate_order_obj(price=taker.price, volume=taker.volume, type=taker.type, expire_ts=taker.ts,
+                                 ts=taker.ts)
+        assert [trade.volume for trade in order_book.add_order(ioc)] == [Decimal("1")]
+        assert not order_book.orders_meta and not order_book.bids
+
+
+class TestOrder:
+
+    def test_positive_order_without_instance_dict(self):
+        ord = generate_order_obj()
+        assert not hasattr(ord, "__dict__")
+        assert isinstance(ord.id, bytes) and len(ord.id) == 16
+
+    def test_positive_order_pickle(self):
+        ord = generate_order_obj()
+        restored = pickle.loads(pickle.dumps(ord))
+        assert restored == ord
+        assert (restored.price, restored.volume, restored.ts) == (ord.price, ord.volume, ord.ts)
+
+    def test_negative_change_frozen_order(self):
+        ord = generate_order_obj()
+        with pytest.raises(Exception):
+            ord.volume = get_rnd_decimal()
+
+
+class TestOrderList:
+
+    def setup(self):
+        self.order_list = OrderList()
+        self.price = get_rnd_decimal()
+        self.orders = [generate_order_obj(price=self.price, type=OrderType.ASK) for _ in range(5)]
+        for ord in self.orders:
+            self.order_list.add_order(ord)
+
+    def test_positive_orders_kept_in_time_priority(self):
+        assert list(self.order_list) == self.orders
+        assert self.order_list.first() is self.orders[0]
+        assert len(self.order_list) == 5
+
+    def test_positive_delete_orders_keeps_priority_and_quantity(self):
+        for idx in (2, 0, 4):
+            self.order_list.del_order(self.orders[idx].id)
+        rest = [self.orders[1], self.orders[3]]
+        assert list(self.order_list) == rest
+        assert self.order_list.first() is self.orders[1]
+        assert self.order_list.quantity == sum(i.volume for i in rest)
+
+    def test_positive_get_order_by_id(self):
+        for ord in self.orders:
+            assert self.order_list.get_order(ord.id) is ord
+
+    def test_negative_delete_not_exist_order(self):
+        with pytest.raises(Exception) as e:
+            self.order_list.del_order(generate_order_obj().id)
+        assert "Order not exist" in str(e.value)
+        assert len(self.order_list) == 5
+
+    def test_negative_add_order_with_other_price(self):
+        ord = generate_order_obj(price=self.price + 1, type=OrderType.ASK)
+        with pytest.raises(Exception) as e:
+            self.order_list.add_order(ord)
+        assert "Invalid price or state" in str(e.value)
+        assert ord.id not in self.order_list
+
+    def test_positive_reduce_order_keeps_priority(self):
+        volume = (self.orders[0].volume / 2).quantize(Decimal("1.00000000"))
+        reduced = self.order_list.reduce_order(self.orders[0].id, volume)
+        assert reduced.volume == volume and reduced.id == self.orders[0].id
+        assert self.order_list.first() is reduced
+        assert self.order_list.quantity == volume + sum(i.volume for i in self.orders[1:])
+
+    def test_positive_fill_orders_from_head(self):
+        volume = self.orders[0].volume + (self.orders[1].volume / 2).quantize(Decimal("1.00000000"))
+        fills, rest = self.order_list.fill(volume)
+        assert rest == 0
+        assert [(i[0].id, i[2]) for i in fills] == [(self.orders[0].id, True), (self.orders[1].id, False)]
+        assert len(self.order_list) == 4